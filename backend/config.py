@@ -23,6 +23,9 @@ class Settings(BaseSettings):
     embedding_provider: str = "ollama"  # "gemini" or "ollama"
     ollama_base_url: str = "http://localhost:11434"
     ollama_model: str = "nomic-embed-text"
+    embedding_cache_dir: Optional[str] = None  # e.g. "./.embcache" to persist embeddings on disk
+    # Reuse results of near-identical earlier searches (per worker; may briefly serve stale chunks)
+    semantic_search_cache: bool = False
     
     # Convex
     convex_url: Optional[str] = None
@@ -31,6 +34,7 @@ class Settings(BaseSettings):
     secret_key: str = "your-secret-key-here"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    log_level: str = "INFO"  # DEBUG shows per-operation database logs
     
     # Testing (REMOVE IN PRODUCTION!)
     test_mode: bool = False
@@ -4,9 +4,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 import uvicorn
 import asyncio
+import logging
 from config import settings
 from routers import auth, pdf, quiz, user, notes
 from middleware.auth import verify_firebase_token
+from utils.database import get_db, close_db
+from services.embeddings import get_embedding_service
+
+logging.basicConfig(level=settings.log_level.upper())
 
 app = FastAPI(title="PDF Quiz System", version="1.0.0")
 
@@ -26,6 +31,16 @@ app.include_router(quiz.router, prefix="/quiz", tags=["quiz"])
 app.include_router(user.router, prefix="/user", tags=["user"])
 app.include_router(notes.router, prefix="/notes", tags=["study-notes"])
 
+@app.on_event("startup")
+async def startup():
+    # Create the shared Firestore client inside the worker process
+    get_db()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_db()
+    await get_embedding_service().aclose()
+
 @app.get("/")
 async def root():
     return {"message": "PDF Quiz System API"}
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+One-off migration: rewrite study-note dates stored as ISO strings
+(generated_at, created_at, updated_at) to native Firestore timestamps.
+Safe to re-run; notes already using timestamps are left untouched.
+"""
+
+import asyncio
+import logging
+
+import services.auth  # noqa: F401  (initializes the Firebase app)
+from utils.database import backfill_notes_timestamps, close_db
+
+async def main():
+    try:
+        count = await backfill_notes_timestamps()
+        print(f"✅ Migrated {count} study notes")
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -22,6 +22,18 @@ class PDFDocument(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class PDFDocumentSummary(BaseModel):
+    """Listing view of a PDF, built from a projected query (no chunks/embeddings)"""
+    id: str
+    user_id: Optional[str] = None
+    filename: Optional[str] = None
+    original_filename: Optional[str] = None
+    file_size: Optional[int] = None
+    storage_path: Optional[str] = None
+    status: Optional[ProcessingStatus] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 class PDFUploadResponse(BaseModel):
     pdf_id: str
     filename: str
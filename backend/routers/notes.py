@@ -9,7 +9,7 @@ from models.quiz import QuizAttempt, Question
 from models.pdf import PDFDocument
 from services.notes_generator import NotesGeneratorService
 from utils.database import (
-    get_quiz_attempt, get_quiz, get_pdf_document,
+    get_attempt_with_quiz, get_pdf_document,
     save_user_notes, get_user_notes, get_notes_by_pdf_id,
     get_all_user_notes_from_db
 )
@@ -25,16 +25,13 @@ async def generate_study_notes(
     """Generate personalized study notes based on quiz performance"""
     
     try:
-        # Get quiz attempt
-        quiz_attempt = await get_quiz_attempt(quiz_attempt_id)
+        # Get quiz attempt and its quiz
+        quiz_attempt, quiz = await get_attempt_with_quiz(quiz_attempt_id)
         
         # Verify ownership
         if quiz_attempt.user_id != user_id:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Get quiz details
-        quiz = await get_quiz(quiz_attempt.quiz_id)
-        
         # Get PDF document
         pdf_document = await get_pdf_document(quiz.pdf_id)
         
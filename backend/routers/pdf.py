@@ -7,17 +7,18 @@ import asyncio
 from middleware.auth import get_current_user_id
 from models.pdf import PDFDocument, PDFUploadResponse, ProcessingStatus
 from services.pdf_processor import PDFProcessor
-from services.embeddings import EmbeddingService
+from services.embeddings import get_embedding_service
 from utils.storage import upload_to_firebase_storage
 from utils.database import (
     save_pdf_document, get_pdf_document, update_pdf_status,
-    get_pdfs_by_user_id, delete_pdf_document
+    update_pdf_document, get_pdfs_by_user_id, delete_pdf_document,
+    PDF_SUMMARY_FIELDS
 )
 from utils.cloudinary import CloudinaryService
 router = APIRouter()
 
 pdf_processor = PDFProcessor()
-embedding_service = EmbeddingService()
+embedding_service = get_embedding_service()
 cloudinary_service = CloudinaryService()
 
 async def process_pdf_background(pdf_id: str, file_bytes: bytes, user_id: str):
@@ -36,13 +37,11 @@ async def process_pdf_background(pdf_id: str, file_bytes: bytes, user_id: str):
         embedding_ids = await embedding_service.store_embeddings(chunks, pdf_id)
         
         # Update PDF document with processed content
-        pdf_doc = await get_pdf_document(pdf_id)
-        pdf_doc.content_chunks = chunks
-        pdf_doc.embedding_ids = embedding_ids
-        pdf_doc.status = ProcessingStatus.COMPLETED
-        pdf_doc.updated_at = datetime.now()
-        
-        await save_pdf_document(pdf_doc)
+        await update_pdf_document(pdf_id, {
+            'content_chunks': chunks,
+            'embedding_ids': embedding_ids,
+            'status': ProcessingStatus.COMPLETED.value
+        })
         
     except Exception as e:
         await update_pdf_status(pdf_id, ProcessingStatus.FAILED)
@@ -123,7 +122,8 @@ async def get_user_pdfs(user_id: str = Depends(get_current_user_id)):
     """Get all PDFs for current user"""
     try:
         print(f"📄 Fetching PDFs for user: {user_id}")
-        pdfs = await get_pdfs_by_user_id(user_id)
+        # Listing only needs metadata, not the stored chunks
+        pdfs = await get_pdfs_by_user_id(user_id, fields=PDF_SUMMARY_FIELDS)
         
         # Add summary statistics
         total_pdfs = len(pdfs)
@@ -167,6 +167,7 @@ async def delete_pdf(
         if pdf_doc.embedding_ids and embedding_service.index:
             try:
                 embedding_service.index.delete(ids=pdf_doc.embedding_ids)
+                embedding_service.invalidate_search_cache(pdf_id)
                 embeddings_deleted = len(pdf_doc.embedding_ids)
                 print(f"✅ Deleted {embeddings_deleted} embeddings from Pinecone")
             except Exception as e:
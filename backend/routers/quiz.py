@@ -2,13 +2,14 @@ from fastapi import APIRouter, Depends, HTTPException
 from typing import List, Dict, Any
 from pydantic import BaseModel
 import uuid
+import asyncio
 from datetime import datetime
 
 from middleware.auth import get_current_user_id
 from models.quiz import Quiz, QuizAttempt, Question
 from models.pdf import PDFDocument
 from services.gemini import GeminiService
-from services.embeddings import EmbeddingService
+from services.embeddings import get_embedding_service
 from utils.database import (
     get_pdf_document, save_quiz, get_quiz, save_quiz_attempt,
     get_user_quiz_attempts, get_quizzes_by_user_id
@@ -16,7 +17,7 @@ from utils.database import (
 
 router = APIRouter()
 gemini_service = GeminiService()
-embedding_service = EmbeddingService()
+embedding_service = get_embedding_service()
 
 class GenerateQuizRequest(BaseModel):
     num_questions: int = 5
@@ -261,13 +262,15 @@ async def get_user_quizzes(user_id: str = Depends(get_current_user_id)):
         # Get all quizzes for the user
         quizzes = await get_quizzes_by_user_id(user_id)
         
+        # Get attempts for every quiz by the current user concurrently
+        attempts_per_quiz = await asyncio.gather(
+            *(get_user_quiz_attempts(user_id, quiz.id) for quiz in quizzes)
+        )
+        
         # Enhance each quiz with status information
         enhanced_quizzes = []
         
-        for quiz in quizzes:
-            # Get attempts for this quiz by the current user
-            attempts = await get_user_quiz_attempts(user_id, quiz.id)
-            
+        for quiz, attempts in zip(quizzes, attempts_per_quiz):
             # Determine quiz status
             if attempts and len(attempts) > 0:
                 # Quiz has been attempted
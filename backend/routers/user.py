@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Dict, Any
 from datetime import datetime, timedelta
+import asyncio
 from models.user import User
 from middleware.auth import get_current_user_id
 from services.gemini import GeminiService
 from utils.database import (
     get_user_quiz_attempts, get_pdf_document, save_user, get_user,
     get_recent_quiz_attempts, get_pdfs_by_user_id, get_quiz, 
-    get_all_quiz_attempts_by_user
+    get_all_quiz_attempts_by_user, get_quizzes_by_ids, get_pdf_documents_by_ids
 )
 from utils.cloudinary import CloudinaryService
 
@@ -20,19 +21,21 @@ async def get_user_dashboard(user_id: str = Depends(get_current_user_id)):
     """Get user dashboard data"""
     try:
         # Get recent quiz attempts
-        recent_attempts = await get_recent_quiz_attempts(user_id, limit=10)
+        recent_attempts = await get_recent_quiz_attempts(
+            user_id, limit=10, fields=['quiz_id', 'score', 'completed_at', 'time_taken']
+        )
         
         # Calculate statistics
         total_quizzes = len(recent_attempts)
         if total_quizzes > 0:
-            avg_score = sum(attempt.score for attempt in recent_attempts) / total_quizzes
-            recent_performance = [attempt.score for attempt in recent_attempts[-5:]]
+            avg_score = sum(attempt['score'] for attempt in recent_attempts) / total_quizzes
+            recent_performance = [attempt['score'] for attempt in recent_attempts[-5:]]
         else:
             avg_score = 0
             recent_performance = []
         
-        # Get PDFs count
-        user_pdfs = await get_pdfs_by_user_id(user_id)
+        # Get PDFs count (keys only)
+        user_pdfs = await get_pdfs_by_user_id(user_id, fields=[])
         
         dashboard_data = {
             "user_id": user_id,
@@ -42,11 +45,11 @@ async def get_user_dashboard(user_id: str = Depends(get_current_user_id)):
             "recent_performance": [round(score * 100, 1) for score in recent_performance],
             "recent_attempts": [
                 {
-                    "id": attempt.id,
-                    "quiz_id": attempt.quiz_id,
-                    "score": round(attempt.score * 100, 1),
-                    "completed_at": attempt.completed_at.isoformat(),
-                    "time_taken": attempt.time_taken
+                    "id": attempt['id'],
+                    "quiz_id": attempt['quiz_id'],
+                    "score": round(attempt['score'] * 100, 1),
+                    "completed_at": attempt['completed_at'].isoformat(),
+                    "time_taken": attempt.get('time_taken')
                 }
                 for attempt in recent_attempts[:5]
             ]
@@ -71,16 +74,18 @@ async def get_recommendations(user_id: str = Depends(get_current_user_id)):
         weak_areas = []
         strong_areas = []
         
+        # Get quiz and PDF details for every attempt in two batched reads
+        quizzes = await get_quizzes_by_ids([attempt.quiz_id for attempt in recent_attempts])
+        pdfs = await get_pdf_documents_by_ids([quiz.pdf_id for quiz in quizzes.values()])
+        
         for attempt in recent_attempts:
             if attempt.score < 0.7:
-                # Get quiz details to understand weak areas
-                quiz = await get_quiz(attempt.quiz_id)
-                pdf_doc = await get_pdf_document(quiz.pdf_id)
-                weak_areas.append(pdf_doc.original_filename)
+                # Quiz details show the weak areas
+                quiz = quizzes[attempt.quiz_id]
+                weak_areas.append(pdfs[quiz.pdf_id].original_filename)
             elif attempt.score > 0.9:
-                quiz = await get_quiz(attempt.quiz_id)
-                pdf_doc = await get_pdf_document(quiz.pdf_id)
-                strong_areas.append(pdf_doc.original_filename)
+                quiz = quizzes[attempt.quiz_id]
+                strong_areas.append(pdfs[quiz.pdf_id].original_filename)
         
         # Generate AI recommendations
         quiz_results = {
@@ -146,13 +151,16 @@ async def get_user_analytics(user_id: str = Depends(get_current_user_id)):
 @router.get("/files")
 async def get_user_files(
     user_id: str = Depends(get_current_user_id),
-    max_results: int = Query(100, ge=1, le=500)
+    # Above Cloudinary's 500-per-request cap, listings follow next_cursor across pages
+    max_results: int = Query(100, ge=1, le=2000)
 ):
     """Get all files uploaded by the current user from Cloudinary"""
     try:
-        # Get files from Cloudinary using both methods
-        files_by_tag = await cloudinary_service.get_files_by_user_id(user_id, max_results)
-        files_by_folder = await cloudinary_service.get_files_by_user_id_in_folder(user_id, max_results)
+        # Get files from Cloudinary using both methods concurrently
+        files_by_tag, files_by_folder = await asyncio.gather(
+            cloudinary_service.get_files_by_user_id(user_id, max_results),
+            cloudinary_service.get_files_by_user_id_in_folder(user_id, max_results)
+        )
         
         # Combine and deduplicate files
         all_files = files_by_tag + files_by_folder
@@ -237,10 +245,13 @@ def calculate_difficulty_performance(attempts: List[Any]) -> Dict[str, float]:
 
 async def calculate_subject_performance(attempts: List[Any]) -> Dict[str, float]:
     """Calculate performance by subject/PDF"""
+    quizzes = await get_quizzes_by_ids([attempt.quiz_id for attempt in attempts])
+    pdfs = await get_pdf_documents_by_ids([quiz.pdf_id for quiz in quizzes.values()])
+    
     subject_scores = {}
     for attempt in attempts:
-        quiz = await get_quiz(attempt.quiz_id)
-        pdf = await get_pdf_document(quiz.pdf_id)
+        quiz = quizzes[attempt.quiz_id]
+        pdf = pdfs[quiz.pdf_id]
         subject = pdf.original_filename
         
         if subject not in subject_scores:
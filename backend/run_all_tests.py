@@ -4,18 +4,29 @@ Master Test Runner
 Runs all tests in sequence and provides comprehensive system analysis
 """
 
+import argparse
 import asyncio
 import subprocess
 import sys
 import time
 from typing import Dict, Any, List
 
+# Tests that decide whether the system is usable at all
+CRITICAL_TESTS = [
+    "Ollama Integration Test",
+    "Pinecone + Ollama Integration", 
+    "End-to-End System Test"
+]
+
+DEFAULT_TIMEOUT = 300  # 5 minutes
+FAST_TIMEOUT = 60
+
 class TestRunner:
     def __init__(self):
         self.test_results = {}
         self.start_time = time.time()
     
-    def run_sync_test(self, test_name: str, script_path: str) -> bool:
+    def run_sync_test(self, test_name: str, script_path: str, timeout: int = DEFAULT_TIMEOUT) -> bool:
         """Run a synchronous test script"""
         print(f"\n🧪 Running {test_name}...")
         print("=" * 60)
@@ -24,7 +35,7 @@ class TestRunner:
             result = subprocess.run([sys.executable, script_path], 
                                   capture_output=False, 
                                   text=True, 
-                                  timeout=300)  # 5 minute timeout
+                                  timeout=timeout)
             
             success = result.returncode == 0
             self.test_results[test_name] = {
@@ -41,7 +52,7 @@ class TestRunner:
             return success
             
         except subprocess.TimeoutExpired:
-            print(f"\n⏰ {test_name} timed out after 5 minutes")
+            print(f"\n⏰ {test_name} timed out after {timeout} seconds")
             self.test_results[test_name] = {
                 "success": False,
                 "error": "timeout",
@@ -125,19 +136,13 @@ class TestRunner:
         # System assessment
         print(f"\n🎯 SYSTEM ASSESSMENT:")
         
-        critical_tests = [
-            "Ollama Integration Test",
-            "Pinecone + Ollama Integration", 
-            "End-to-End System Test"
-        ]
-        
-        critical_passed = sum(1 for test in critical_tests if test in passed_tests)
+        critical_passed = sum(1 for test in CRITICAL_TESTS if test in passed_tests)
         
-        if critical_passed == len(critical_tests):
+        if critical_passed == len(CRITICAL_TESTS):
             print("   🎉 PRODUCTION READY: All critical systems working!")
             print("   💡 Your PDF Quiz System is fully functional")
             
-        elif critical_passed >= len(critical_tests) * 0.8:
+        elif critical_passed >= len(CRITICAL_TESTS) * 0.8:
             print("   ✅ MOSTLY READY: Core functionality working with minor issues")
             print("   💡 Address failed tests before production deployment")
             
@@ -189,12 +194,15 @@ class TestRunner:
         print("   • Pinecone Setup: See PINECONE_SETUP.md")
         print("   • Embedding Guide: See EMBEDDING_TESTING_GUIDE.md")
 
-async def main():
+async def main(fast: bool = False):
     """Run all tests in sequence"""
     print("🧪 COMPREHENSIVE PDF QUIZ SYSTEM TEST SUITE")
     print("=" * 80)
-    print("This will run all available tests to verify system functionality")
-    print("Estimated time: 5-10 minutes depending on system performance")
+    if fast:
+        print("⚡ Fast mode: running critical tests only, stopping at the first failure")
+    else:
+        print("This will run all available tests to verify system functionality")
+        print("Estimated time: 5-10 minutes depending on system performance")
     
     runner = TestRunner()
     
@@ -207,13 +215,23 @@ async def main():
         ("Load Performance Test", "test_load_performance.py")
     ]
     
+    if fast:
+        tests = [test for test in tests if test[0] in CRITICAL_TESTS]
+    timeout = FAST_TIMEOUT if fast else DEFAULT_TIMEOUT
+    
     # Run all tests
     for test_name, script_path in tests:
         try:
-            runner.run_sync_test(test_name, script_path)
+            success = runner.run_sync_test(test_name, script_path, timeout=timeout)
+            
+            if fast and not success:
+                print(f"\n⛔ Fast mode: stopping after failed test '{test_name}'")
+                runner.print_summary()
+                sys.exit(1)
             
             # Brief pause between tests
-            await asyncio.sleep(2)
+            if not fast:
+                await asyncio.sleep(2)
             
         except KeyboardInterrupt:
             print(f"\n⚠️  Test suite interrupted by user")
@@ -230,8 +248,13 @@ async def main():
     runner.print_summary()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the PDF Quiz System test suite")
+    parser.add_argument("--fast", action="store_true",
+                        help="Run only critical tests with short timeouts and exit on the first failure")
+    args = parser.parse_args()
+    
     try:
-        asyncio.run(main())
+        asyncio.run(main(fast=args.fast))
     except KeyboardInterrupt:
         print("\n\n⚠️  Test suite interrupted by user")
         print("💡 Run individual tests if needed:")
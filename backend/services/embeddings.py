@@ -1,13 +1,71 @@
 from pinecone import Pinecone, ServerlessSpec
 import google.generativeai as genai
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
+import asyncio
 import json
-from typing import List, Dict, Any
+import os
+import functools
+from collections import OrderedDict
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
 import hashlib
 import uuid
 import socket
+import time
+import random
+from urllib.parse import urlsplit, urlunsplit
 from config import settings
 
+# Pooled keep-alive session for synchronous Ollama calls
+_session = requests.Session()
+# No retries: the only caller is the Ollama status probe, where a quick "down" answer
+# (cached for OLLAMA_DOWN_TTL) beats repeated connection attempts
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+# How long a successful Ollama /api/tags check is trusted before re-probing
+OLLAMA_STATUS_TTL = 60
+# How long a failed check is trusted, so an Ollama outage isn't re-probed on every call
+OLLAMA_DOWN_TTL = 5
+
+# Texts per /api/embed request, and how many Ollama embedding requests (batched or
+# per-prompt) may be in flight at once
+OLLAMA_BATCH_SIZE = 32
+OLLAMA_MAX_CONCURRENT_BATCHES = 5
+
+# Vectors per Pinecone upsert request
+PINECONE_UPSERT_BATCH_SIZE = 100
+
+# Number of query embeddings kept in the in-memory LRU cache; document chunks
+# only go to the disk cache so one large PDF can't evict every cached query
+EMBED_CACHE_SIZE = 1024
+
+# When settings.semantic_search_cache is on, similarity searches whose query embedding has
+# cosine similarity of at least this with an earlier query on the same PDF reuse the earlier
+# results (matches and scores) instead of querying Pinecone. The cache is per process:
+# invalidate_search_cache only clears the worker that deleted or re-upserted the PDF, so
+# other workers can serve stale chunks for up to SEMANTIC_CACHE_TTL.
+SEMANTIC_CACHE_THRESHOLD = 0.95
+SEMANTIC_CACHE_SIZE = 256
+# Seconds a cached search result is reused; Pinecone indexes upserts with a delay, so
+# results cached just after processing may be missing chunks until they expire
+SEMANTIC_CACHE_TTL = 300
+
+def _resolve_local_url(url: str) -> str:
+    """Resolve a localhost base URL to its IP once so requests skip per-call name lookups"""
+    parts = urlsplit(url)
+    if parts.hostname != "localhost":
+        return url
+    try:
+        ip = socket.gethostbyname(parts.hostname)
+    except socket.gaierror:
+        return url
+    netloc = f"{ip}:{parts.port}" if parts.port else ip
+    return urlunsplit(parts._replace(netloc=netloc))
+
 class EmbeddingService:
     def __init__(self):
         # Initialize based on provider
@@ -15,31 +73,74 @@ class EmbeddingService:
         
         if self.provider == "gemini":
             genai.configure(api_key=settings.gemini_api_key)
+            self.embedding_model = "models/embedding-001"
             self.embedding_dimension = 768
         elif self.provider == "ollama":
-            self.ollama_url = settings.ollama_base_url
+            self.ollama_url = _resolve_local_url(settings.ollama_base_url)
             self.ollama_model = settings.ollama_model
+            self.embedding_model = self.ollama_model
             self.embedding_dimension = 768  # nomic-embed-text dimension
         else:
             print(f"⚠️  Unknown embedding provider: {self.provider}")
             print("📝 Falling back to hash-based embeddings")
             self.provider = "fallback"
+            self.embedding_model = "fallback"
             self.embedding_dimension = 768
         
         print(f"🧠 Embedding provider: {self.provider}")
         
         # Pinecone will be initialized lazily
         self._pinecone_initialized = False
+        self._pinecone_lock = asyncio.Lock()
         self.pc = None
         self.index = None
+        
+        # Shared async HTTP client for Ollama, created lazily inside the event loop
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._ollama_ok_until = 0.0
+        self._ollama_down_until = 0.0
+        self._ollama_semaphore = asyncio.Semaphore(OLLAMA_MAX_CONCURRENT_BATCHES)
+        
+        # In-memory LRU of float32 query embeddings keyed by sha256(model|text)
+        self._embed_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        
+        # Recent similarity searches as (pdf_id, top_k, unit query vector, results, expires)
+        self._search_cache: List[Tuple[str, int, np.ndarray, List[Dict[str, Any]], float]] = []
+    
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Get the pooled async HTTP client used for Ollama embedding requests"""
+        if self._http_client is None:
+            # Requests are fanned out concurrently; the Ollama server only runs them in
+            # parallel if started with OLLAMA_NUM_PARALLEL > 1, otherwise it queues them.
+            # Requests are also gated by _ollama_semaphore; time spent waiting for a pooled
+            # connection isn't capped, so queued requests don't time out before they're sent.
+            self._http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(30, pool=None),
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=16)
+            )
+        return self._http_client
+    
+    async def aclose(self) -> None:
+        """Close the shared Ollama HTTP client (FastAPI shutdown hook)"""
+        if self._http_client is not None:
+            client, self._http_client = self._http_client, None
+            await client.aclose()
     
     def _test_ollama_connection(self) -> bool:
-        """Test if Ollama is running and model is available"""
+        """Test if Ollama is running and model is available (blocking; see _check_ollama)"""
+        now = time.monotonic()
+        if now < self._ollama_ok_until:
+            return True
+        if now < self._ollama_down_until:
+            return False
+        
         try:
             # Test if Ollama is running
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=5)
+            response = _session.get(f"{self.ollama_url}/api/tags", timeout=5)
             if response.status_code != 200:
-                return False
+                return self._ollama_down()
             
             # Check if our model is available
             models = response.json().get("models", [])
@@ -48,13 +149,46 @@ class EmbeddingService:
             if self.ollama_model not in model_names:
                 print(f"📥 Model '{self.ollama_model}' not found. Available models: {model_names}")
                 print(f"💡 Run: ollama pull {self.ollama_model}")
-                return False
+                return self._ollama_down()
             
+            self._ollama_ok_until = time.monotonic() + OLLAMA_STATUS_TTL
             return True
             
         except Exception as e:
             print(f"❌ Ollama connection failed: {e}")
+            return self._ollama_down()
+    
+    def _ollama_down(self) -> bool:
+        """Remember a failed Ollama check briefly so a newly started Ollama is still picked up soon"""
+        self._ollama_down_until = time.monotonic() + OLLAMA_DOWN_TTL
+        return False
+    
+    async def _check_ollama(self) -> bool:
+        """Check Ollama availability without blocking the event loop on the HTTP probe"""
+        now = time.monotonic()
+        if now < self._ollama_ok_until:
+            return True
+        if now < self._ollama_down_until:
             return False
+        return await asyncio.to_thread(self._test_ollama_connection)
+    
+    def _wait_for_index_ready(self, index_name: str, max_wait: float = 60,
+                              base_delay: float = 0.5, max_delay: float = 8) -> bool:
+        """Poll a new Pinecone index with exponential backoff and jitter until it is ready"""
+        deadline = time.monotonic() + max_wait
+        attempt = 0
+        
+        while True:
+            if self.pc.describe_index(index_name).status["ready"]:
+                return True
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            time.sleep(min(delay, remaining))
+            attempt += 1
     
     def _init_pinecone(self):
         """Initialize Pinecone connection lazily with modern API"""
@@ -93,9 +227,13 @@ class EmbeddingService:
                     spec=ServerlessSpec(
                         cloud="aws",
                         region="us-east-1"
-                    )
+                    ),
+                    timeout=-1  # Don't use the SDK's fixed 5s polling; wait below instead
                 )
-                print(f"✅ Index created: {index_name}")
+                if self._wait_for_index_ready(index_name):
+                    print(f"✅ Index created: {index_name}")
+                else:
+                    print(f"⚠️  Index '{index_name}' created but not ready yet")
             else:
                 print(f"✅ Index '{index_name}' already exists")
             
@@ -113,51 +251,93 @@ class EmbeddingService:
             print("📝 Continuing in test mode - embeddings will work but won't be stored in vector database")
             print("💡 To fix: Check network connection, API key, and Pinecone setup")
 
-    async def generate_embeddings_ollama(self, texts: List[str]) -> List[List[float]]:
+    async def _ensure_pinecone(self) -> None:
+        """Initialize Pinecone once, even when the first requests arrive concurrently"""
+        if self._pinecone_initialized:
+            return
+        async with self._pinecone_lock:
+            # Re-check: another request may have finished initializing while we waited
+            if not self._pinecone_initialized:
+                # Control-plane calls are blocking, so keep them off the event loop
+                await asyncio.to_thread(self._init_pinecone)
+
+    async def _embed_ollama_batch(self, client: httpx.AsyncClient, texts: List[str]) -> Optional[List[List[float]]]:
+        """Generate embeddings for a batch of texts in one request via Ollama's /api/embed endpoint.
+        Returns None if the server predates the batch endpoint."""
+        async with self._ollama_semaphore:
+            response = await client.post(
+                f"{self.ollama_url}/api/embed",
+                json={
+                    "model": self.ollama_model,
+                    "input": texts
+                }
+            )
+        
+        if response.status_code == 404:
+            return None
+        
+        response.raise_for_status()
+        return response.json().get("embeddings", [])
+
+    async def _embed_ollama(self, client: httpx.AsyncClient, text: str) -> Optional[List[float]]:
+        """Generate a single embedding via the Ollama API, returning None on API errors"""
+        async with self._ollama_semaphore:
+            response = await client.post(
+                f"{self.ollama_url}/api/embeddings",
+                json={
+                    "model": self.ollama_model,
+                    "prompt": text
+                }
+            )
+        
+        if response.status_code == 200:
+            return response.json().get("embedding", [])
+        
+        print(f"❌ Ollama API error: {response.status_code}")
+        return None
+
+    async def generate_embeddings_ollama(self, texts: List[str], is_query: bool = False) -> List[List[float]]:
         """Generate embeddings using Ollama"""
         try:
-            if not self._test_ollama_connection():
+            if not await self._check_ollama():
                 print("❌ Ollama not available, using fallback embeddings")
                 return self._fallback_embeddings(texts)
             
-            embeddings = []
-            for text in texts:
-                response = requests.post(
-                    f"{self.ollama_url}/api/embeddings",
-                    json={
-                        "model": self.ollama_model,
-                        "prompt": text
-                    },
-                    timeout=30
-                )
+            client = self._get_http_client()
+            batches = [texts[i:i + OLLAMA_BATCH_SIZE] for i in range(0, len(texts), OLLAMA_BATCH_SIZE)]
+            results = await asyncio.gather(*[self._embed_ollama_batch(client, batch) for batch in batches])
+            
+            if any(result is None for result in results):
+                # Older Ollama versions only expose the per-prompt /api/embeddings route
+                embeddings = await asyncio.gather(*[self._embed_ollama(client, text) for text in texts])
                 
-                if response.status_code == 200:
-                    embedding = response.json().get("embedding", [])
-                    embeddings.append(embedding)
-                else:
-                    print(f"❌ Ollama API error: {response.status_code}")
+                if any(embedding is None for embedding in embeddings):
                     return self._fallback_embeddings(texts)
+            else:
+                embeddings = [embedding for result in results for embedding in result]
             
             print(f"✅ Generated {len(embeddings)} embeddings using Ollama ({self.ollama_model})")
+            await self._save_cached_embeddings(texts, embeddings, in_memory=is_query)
             return embeddings
             
         except Exception as e:
             print(f"❌ Ollama embedding error: {e}")
             return self._fallback_embeddings(texts)
 
-    async def generate_embeddings_gemini(self, texts: List[str]) -> List[List[float]]:
+    async def generate_embeddings_gemini(self, texts: List[str], is_query: bool = False) -> List[List[float]]:
         """Generate embeddings using Gemini"""
         try:
             embeddings = []
             for text in texts:
                 result = genai.embed_content(
-                    model="models/embedding-001",
+                    model=self.embedding_model,
                     content=text,
                     task_type="retrieval_document"
                 )
                 embeddings.append(result['embedding'])
             
             print(f"✅ Generated {len(embeddings)} embeddings using Gemini")
+            await self._save_cached_embeddings(texts, embeddings, in_memory=is_query)
             return embeddings
             
         except Exception as e:
@@ -169,28 +349,145 @@ class EmbeddingService:
                 print(f"❌ Error generating embeddings: {e}")
             return self._fallback_embeddings(texts)
 
-    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings using the configured provider"""
-        if self.provider == "ollama":
-            return await self.generate_embeddings_ollama(texts)
-        elif self.provider == "gemini":
-            return await self.generate_embeddings_gemini(texts)
-        else:
+    def _cache_key(self, text: str) -> bytes:
+        """Cache key for a text under the current embedding model"""
+        return hashlib.sha256(f"{self.embedding_model}|{text}".encode()).digest()
+
+    def _cache_path(self, key: bytes) -> Optional[str]:
+        """Get the on-disk cache file for a key, or None if disk caching is disabled"""
+        if not settings.embedding_cache_dir:
+            return None
+        return os.path.join(settings.embedding_cache_dir, f"{key.hex()}.npy")
+
+    def _remember_embedding(self, key: bytes, embedding: np.ndarray) -> None:
+        """Add an embedding to the in-memory LRU cache"""
+        self._embed_cache[key] = embedding
+        self._embed_cache.move_to_end(key)
+        if len(self._embed_cache) > EMBED_CACHE_SIZE:
+            self._embed_cache.popitem(last=False)
+
+    def _load_cached_embedding(self, key: bytes) -> Optional[List[float]]:
+        """Load a previously generated embedding from the in-memory cache"""
+        embedding = self._embed_cache.get(key)
+        if embedding is None:
+            return None
+        self._embed_cache.move_to_end(key)
+        return embedding.tolist()
+
+    def _read_disk_embeddings(self, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        """Read cached embeddings from disk (blocking; run via asyncio.to_thread).
+        Missing, unreadable or wrongly shaped files count as misses."""
+        vectors = []
+        for key in keys:
+            path = self._cache_path(key)
+            vector = None
+            try:
+                vector = np.load(path)
+                if vector.shape != (self.embedding_dimension,):
+                    vector = None
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"⚠️  Could not read cached embedding {path}: {e}")
+            vectors.append(vector)
+        return vectors
+
+    def _write_disk_embeddings(self, items: List[Tuple[bytes, np.ndarray]]) -> None:
+        """Write embeddings to the disk cache (blocking; run via asyncio.to_thread).
+        Each file is written under a temporary name and renamed into place, so readers
+        never see a partially written .npy."""
+        os.makedirs(settings.embedding_cache_dir, exist_ok=True)
+        for key, vector in items:
+            path = self._cache_path(key)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    np.save(f, vector)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    async def _save_cached_embeddings(self, texts: List[str], embeddings: List[List[float]],
+                                      in_memory: bool = False) -> None:
+        """Cache provider-generated embeddings on disk as float32 (if enabled) and, for
+        queries, in memory"""
+        try:
+            items = []
+            for text, embedding in zip(texts, embeddings):
+                key = self._cache_key(text)
+                vector = np.asarray(embedding, dtype=np.float32)
+                if in_memory:
+                    self._remember_embedding(key, vector)
+                items.append((key, vector))
+            if settings.embedding_cache_dir:
+                await asyncio.to_thread(self._write_disk_embeddings, items)
+        except Exception as e:
+            print(f"⚠️  Could not write embedding cache: {e}")
+
+    def cache_info(self) -> Dict[str, int]:
+        """Get embedding cache statistics"""
+        return {
+            "hits": self._cache_hits,
+            "misses": self._cache_misses,
+            "size": len(self._embed_cache),
+            "maxsize": EMBED_CACHE_SIZE
+        }
+
+    async def generate_embeddings(self, texts: List[str], is_query: bool = False) -> List[List[float]]:
+        """Generate embeddings using the configured provider
+
+        Only query embeddings (is_query=True) are kept in the in-memory cache;
+        document chunks are cached on disk alone.
+        """
+        if self.provider == "fallback":
             return self._fallback_embeddings(texts)
+        
+        # Only texts missing from the cache are sent to the provider
+        keys = [self._cache_key(text) for text in texts]
+        embeddings = [self._load_cached_embedding(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        if missing and settings.embedding_cache_dir:
+            # Disk reads are blocking, so do them all in one trip off the event loop
+            vectors = await asyncio.to_thread(self._read_disk_embeddings, [keys[i] for i in missing])
+            for i, vector in zip(missing, vectors):
+                if vector is not None:
+                    if is_query:
+                        self._remember_embedding(keys[i], vector)
+                    embeddings[i] = vector.tolist()
+            missing = [i for i in missing if embeddings[i] is None]
+        
+        self._cache_hits += len(texts) - len(missing)
+        self._cache_misses += len(missing)
+        
+        if len(missing) < len(texts):
+            print(f"📦 Loaded {len(texts) - len(missing)} embeddings from cache")
+        
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            if self.provider == "ollama":
+                generated = await self.generate_embeddings_ollama(missing_texts, is_query)
+            else:
+                generated = await self.generate_embeddings_gemini(missing_texts, is_query)
+            
+            for i, embedding in zip(missing, generated):
+                embeddings[i] = embedding
+        
+        return embeddings
 
     def _fallback_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Simple fallback embedding using text hashing"""
-        embeddings = []
-        for text in texts:
-            # Create a simple hash-based embedding
-            hash_obj = hashlib.sha256(text.encode())
-            hash_bytes = hash_obj.digest()
-            # Convert to float values between -1 and 1
-            embedding = [(b - 128) / 128.0 for b in hash_bytes[:100]]
-            # Pad to match expected dimension
-            while len(embedding) < self.embedding_dimension:
-                embedding.extend(embedding[:min(len(embedding), self.embedding_dimension - len(embedding))])
-            embeddings.append(embedding[:self.embedding_dimension])
+        # One sha256 digest per text, as a (N, 32) uint8 matrix
+        digests = np.frombuffer(
+            b"".join(hashlib.sha256(text.encode()).digest() for text in texts),
+            dtype=np.uint8
+        ).reshape(len(texts), 32)
+        # Convert to float values between -1 and 1
+        values = (digests.astype(np.float32) - 128) / 128
+        # Tile the digest values to match the expected dimension
+        repeats = -(-self.embedding_dimension // values.shape[1])
+        embeddings = np.tile(values, (1, repeats))[:, :self.embedding_dimension].tolist()
         
         print(f"📝 Generated {len(embeddings)} fallback embeddings")
         return embeddings
@@ -200,7 +497,7 @@ class EmbeddingService:
         embeddings = await self.generate_embeddings(texts)
         
         # Try to initialize Pinecone if not already done
-        self._init_pinecone()
+        await self._ensure_pinecone()
         
         vectors = []
         embedding_ids = []
@@ -222,10 +519,13 @@ class EmbeddingService:
                 }
             })
         
-        # Upsert vectors to Pinecone if available
+        # Upsert vectors to Pinecone if available, in concurrent request-sized batches
         if self.index:
+            self.invalidate_search_cache(pdf_id)
             try:
-                self.index.upsert(vectors=vectors)
+                batches = [vectors[i:i + PINECONE_UPSERT_BATCH_SIZE]
+                           for i in range(0, len(vectors), PINECONE_UPSERT_BATCH_SIZE)]
+                await asyncio.gather(*[asyncio.to_thread(self.index.upsert, vectors=batch) for batch in batches])
                 print(f"✅ Stored {len(vectors)} embeddings in Pinecone")
             except Exception as e:
                 print(f"❌ Error storing embeddings in Pinecone: {e}")
@@ -234,17 +534,56 @@ class EmbeddingService:
             
         return embedding_ids
 
+    def _lookup_search_cache(self, pdf_id: str, top_k: int, query_vector: np.ndarray) -> Optional[List[Dict[str, Any]]]:
+        """Find cached results for a semantically equivalent earlier query on the same PDF"""
+        now = time.monotonic()
+        self._search_cache = [entry for entry in self._search_cache if entry[4] > now]
+        candidates = [entry for entry in self._search_cache if entry[0] == pdf_id and entry[1] == top_k]
+        if not candidates:
+            return None
+        
+        similarities = np.stack([entry[2] for entry in candidates]) @ query_vector
+        best = int(np.argmax(similarities))
+        if similarities[best] >= SEMANTIC_CACHE_THRESHOLD:
+            return [dict(result) for result in candidates[best][3]]
+        return None
+
+    def _remember_search(self, pdf_id: str, top_k: int, query_vector: np.ndarray,
+                         results: List[Dict[str, Any]]) -> None:
+        """Add similarity search results to the semantic cache"""
+        if not results:
+            # Likely vectors Pinecone hasn't indexed yet; don't serve "no matches" to similar queries
+            return
+        self._search_cache.append((pdf_id, top_k, query_vector, [dict(result) for result in results],
+                                   time.monotonic() + SEMANTIC_CACHE_TTL))
+        if len(self._search_cache) > SEMANTIC_CACHE_SIZE:
+            self._search_cache.pop(0)
+
+    def invalidate_search_cache(self, pdf_id: str) -> None:
+        """Drop cached similarity search results for a PDF whose vectors changed"""
+        self._search_cache = [entry for entry in self._search_cache if entry[0] != pdf_id]
+
     async def similarity_search(self, query: str, pdf_id: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Search for similar content in the PDF"""
         # Try to initialize Pinecone if not already done
-        self._init_pinecone()
+        await self._ensure_pinecone()
         
         if not self.index:
             print("📝 Pinecone not available, returning empty results")
             return []
         
         try:
-            query_embedding = await self.generate_embeddings([query])
+            query_embedding = await self.generate_embeddings([query], is_query=True)
+            
+            query_vector = np.asarray(query_embedding[0], dtype=np.float32)
+            norm = np.linalg.norm(query_vector)
+            if norm > 0:
+                query_vector /= norm
+            
+            if settings.semantic_search_cache:
+                cached_results = self._lookup_search_cache(pdf_id, top_k, query_vector)
+                if cached_results is not None:
+                    return cached_results
             
             results = self.index.query(
                 vector=query_embedding[0],
@@ -253,7 +592,7 @@ class EmbeddingService:
                 include_metadata=True
             )
             
-            return [
+            search_results = [
                 {
                     "id": match.id,
                     "score": match.score,
@@ -263,6 +602,14 @@ class EmbeddingService:
                 }
                 for match in results.matches
             ]
+            if settings.semantic_search_cache:
+                self._remember_search(pdf_id, top_k, query_vector, search_results)
+            return search_results
         except Exception as e:
             print(f"❌ Error during similarity search: {e}")
-            return []
\ No newline at end of file
+            return []
+
+@functools.lru_cache(maxsize=1)
+def get_embedding_service() -> EmbeddingService:
+    """Get the shared EmbeddingService so Pinecone and HTTP connection pools are reused app-wide"""
+    return EmbeddingService()
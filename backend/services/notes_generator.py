@@ -1,14 +1,14 @@
 from typing import List, Dict, Any, Optional
 import json
 from datetime import datetime, timedelta
-from services.embeddings import EmbeddingService
+from services.embeddings import get_embedding_service
 from services.gemini import GeminiService
 from models.quiz import QuizAttempt, Question
 from models.pdf import PDFDocument
 
 class NotesGeneratorService:
     def __init__(self):
-        self.embedding_service = EmbeddingService()
+        self.embedding_service = get_embedding_service()
         self.gemini_service = GeminiService()
     
     async def analyze_quiz_performance(self, quiz_attempt: QuizAttempt, questions: List[Question]) -> Dict[str, Any]:
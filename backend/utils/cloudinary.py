@@ -1,10 +1,30 @@
 import cloudinary
 import cloudinary.uploader
+import cloudinary.api
 from cloudinary.utils import cloudinary_url
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, BinaryIO, Union, Tuple
+import asyncio
+import io
+import time
 import uuid
 from datetime import datetime
 from config import settings
+
+# Chunk size for upload_large: the network upload is split into requests of this size
+# (the PDF itself is still read into memory by the upload router)
+UPLOAD_CHUNK_SIZE = 6_000_000
+
+# Spaces and dots in filenames become underscores in public IDs
+_FILENAME_TRANS = str.maketrans(" .", "__")
+
+# Cloudinary's per-request cap for resource listings
+MAX_RESULTS_PER_PAGE = 500
+
+# Signed URLs keyed by (public_id, expires_in, time window). A URL is reused for at
+# most half its lifetime, so callers always get at least expires_in/2 of validity.
+SIGNED_URL_CACHE_SIZE = 10_000
+_signed_url_cache: Dict[Tuple[str, int, int], str] = {}
+
 cloudinary.config(
     cloud_name=settings.cloudinary_cloud_name,
     api_key=settings.cloudinary_api_key,
@@ -12,31 +32,64 @@ cloudinary.config(
     secure=True
 )
 
+def _to_file_info(resource: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a Cloudinary resource into the file info returned by the listing methods"""
+    context = resource.get("context", {})
+    file_info = {
+        "public_id": resource["public_id"],
+        "secure_url": resource["secure_url"],
+        "url": resource["url"],
+        "bytes": resource["bytes"],
+        "format": resource.get("format", ""),
+        "resource_type": resource["resource_type"],
+        "created_at": resource["created_at"],
+        "context": context,
+        "tags": resource.get("tags", [])
+    }
+    
+    # Extract original filename from context if available
+    if "original_filename" in context:
+        file_info["original_filename"] = context["original_filename"]
+    
+    return file_info
+
 class CloudinaryService:
+    __slots__ = ("folder_prefix",)
+    
     def __init__(self):
         self.folder_prefix = "pdf-quiz-system"
     
-    async def upload_pdf(self, file_bytes: bytes, filename: str, user_id: str) -> Dict[str, Any]:
-        """Upload PDF to Cloudinary"""
+    async def upload_pdf(self, file_obj: Union[BinaryIO, bytes], filename: str, user_id: str) -> Dict[str, Any]:
+        """Upload PDF to Cloudinary in chunked requests from a file-like object or bytes
+
+        Chunking only splits the network upload; it doesn't reduce memory use when the
+        caller passes bytes (as the upload router does, since processing needs them too).
+        File objects stay owned by the caller and are not closed here.
+        """
         try:
             # Create unique filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            now = datetime.now()
+            timestamp = now.strftime("%Y%m%d_%H%M%S")
             unique_id = uuid.uuid4().hex[:8]
-            clean_filename = filename.replace(" ", "_").replace(".", "_")
+            clean_filename = filename.translate(_FILENAME_TRANS)
             public_id = f"{self.folder_prefix}/users/{user_id}/pdfs/{timestamp}_{unique_id}_{clean_filename}"
             
             print(f"DEBUG: Uploading to Cloudinary - public_id: {public_id}")
-            print(f"DEBUG: File size: {len(file_bytes)} bytes")
+            if isinstance(file_obj, bytes):
+                print(f"DEBUG: File size: {len(file_obj)} bytes")
+                file_obj = io.BytesIO(file_obj)
             
-            # Upload file
-            result = cloudinary.uploader.upload(
-                file_bytes,
+            # Upload file in chunks without blocking the event loop
+            result = await asyncio.to_thread(
+                cloudinary.uploader.upload_large,
+                file_obj,
+                chunk_size=UPLOAD_CHUNK_SIZE,
                 public_id=public_id,
                 resource_type="raw",  # For non-image files
                 context={
                     "user_id": user_id,
                     "original_filename": filename,
-                    "upload_date": datetime.now().isoformat()
+                    "upload_date": now.isoformat()
                 },
                 tags=["pdf", "user_upload", f"user_{user_id}"]
             )
@@ -60,6 +113,12 @@ class CloudinaryService:
     
     async def get_file_url(self, public_id: str, expires_in: int = 3600) -> str:
         """Generate signed URL for file access"""
+        window = int(time.time()) // max(1, expires_in // 2)
+        cache_key = (public_id, expires_in, window)
+        cached_url = _signed_url_cache.get(cache_key)
+        if cached_url is not None:
+            return cached_url
+        
         try:
             # Generate signed URL that expires
             url, options = cloudinary_url(
@@ -71,6 +130,11 @@ class CloudinaryService:
                     "duration": expires_in
                 }
             )
+            
+            # Entries from past windows are never hit again, so just start over when full
+            if len(_signed_url_cache) >= SIGNED_URL_CACHE_SIZE:
+                _signed_url_cache.clear()
+            _signed_url_cache[cache_key] = url
             return url
         except Exception as e:
             raise Exception(f"Failed to generate file URL: {str(e)}")
@@ -78,7 +142,8 @@ class CloudinaryService:
     async def delete_file(self, public_id: str) -> bool:
         """Delete file from Cloudinary"""
         try:
-            result = cloudinary.uploader.destroy(
+            result = await asyncio.to_thread(
+                cloudinary.uploader.destroy,
                 public_id,
                 resource_type="raw"
             )
@@ -89,7 +154,8 @@ class CloudinaryService:
     async def get_file_info(self, public_id: str) -> Dict[str, Any]:
         """Get file information from Cloudinary"""
         try:
-            result = cloudinary.api.resource(
+            result = await asyncio.to_thread(
+                cloudinary.api.resource,
                 public_id,
                 resource_type="raw"
             )
@@ -97,39 +163,42 @@ class CloudinaryService:
         except Exception as e:
             raise Exception(f"Failed to get file info: {str(e)}")
     
+    async def _list_resources(self, max_results: int, **params) -> List[Dict[str, Any]]:
+        """List raw uploads, following next_cursor until max_results resources are collected"""
+        resources = []
+        next_cursor = None
+        
+        while len(resources) < max_results:
+            page_params = dict(params)
+            if next_cursor:
+                page_params["next_cursor"] = next_cursor
+            
+            result = await asyncio.to_thread(
+                cloudinary.api.resources,
+                type="upload",
+                resource_type="raw",
+                max_results=min(MAX_RESULTS_PER_PAGE, max_results - len(resources)),
+                **page_params
+            )
+            resources.extend(result.get('resources', []))
+            
+            next_cursor = result.get('next_cursor')
+            if not next_cursor:
+                break
+        
+        return resources
+    
     async def get_files_by_user_id(self, user_id: str, max_results: int = 100) -> List[Dict[str, Any]]:
         """Get all files uploaded by a specific user"""
         try:
             # Search for files with the user_id tag
-            result = cloudinary.api.resources(
-                type="upload",
-                resource_type="raw",
+            resources = await self._list_resources(
+                max_results,
                 tags=[f"user_{user_id}"],
-                max_results=max_results,
                 context=True  # Include context metadata
             )
             
-            files = []
-            for resource in result.get('resources', []):
-                # Extract file info
-                file_info = {
-                    "public_id": resource["public_id"],
-                    "secure_url": resource["secure_url"],
-                    "url": resource["url"],
-                    "bytes": resource["bytes"],
-                    "format": resource.get("format", ""),
-                    "resource_type": resource["resource_type"],
-                    "created_at": resource["created_at"],
-                    "context": resource.get("context", {}),
-                    "tags": resource.get("tags", [])
-                }
-                
-                # Extract original filename from context if available
-                context = resource.get("context", {})
-                if "original_filename" in context:
-                    file_info["original_filename"] = context["original_filename"]
-                
-                files.append(file_info)
+            files = [_to_file_info(resource) for resource in resources]
             
             print(f"DEBUG: Found {len(files)} files for user {user_id}")
             return files
@@ -144,34 +213,13 @@ class CloudinaryService:
             # Search for files in the user's folder
             folder_prefix = f"{self.folder_prefix}/users/{user_id}/"
             
-            result = cloudinary.api.resources(
-                type="upload",
-                resource_type="raw",
+            resources = await self._list_resources(
+                max_results,
                 prefix=folder_prefix,
-                max_results=max_results,
                 context=True
             )
             
-            files = []
-            for resource in result.get('resources', []):
-                file_info = {
-                    "public_id": resource["public_id"],
-                    "secure_url": resource["secure_url"],
-                    "url": resource["url"],
-                    "bytes": resource["bytes"],
-                    "format": resource.get("format", ""),
-                    "resource_type": resource["resource_type"],
-                    "created_at": resource["created_at"],
-                    "context": resource.get("context", {}),
-                    "tags": resource.get("tags", [])
-                }
-                
-                # Extract original filename from context
-                context = resource.get("context", {})
-                if "original_filename" in context:
-                    file_info["original_filename"] = context["original_filename"]
-                
-                files.append(file_info)
+            files = [_to_file_info(resource) for resource in resources]
             
             print(f"DEBUG: Found {len(files)} files in folder for user {user_id}")
             return files
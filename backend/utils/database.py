@@ -1,13 +1,58 @@
 # utils/database.py
-from firebase_admin import firestore
-from typing import List, Optional, Dict, Any
-from models.pdf import PDFDocument, ProcessingStatus
+from firebase_admin import firestore, firestore_async
+from typing import List, Optional, Dict, Any, Tuple, Union, AsyncIterator
+from collections import OrderedDict, defaultdict
+from models.pdf import PDFDocument, PDFDocumentSummary, ProcessingStatus
 from models.quiz import Quiz, QuizAttempt
 from models.user import User
-from datetime import datetime
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from models.notes import StudyNotes
+from datetime import datetime, timezone
 from config import settings
+import asyncio
+import functools
+import inspect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Collection names
+PDFS = 'pdfs'
+QUIZZES = 'quizzes'
+ATTEMPTS = 'quiz_attempts'
+USERS = 'users'
+NOTES = 'study_notes'
+RECS = 'recommendations'
+
+# Firestore rejects write batches with more than 500 operations
+FIRESTORE_BATCH_LIMIT = 500
+# Maximum number of values in a single 'in' filter
+FIRESTORE_IN_LIMIT = 30
+
+# Fields needed to render PDF listings (skips the bulky content_chunks/embedding_ids)
+PDF_SUMMARY_FIELDS = ['user_id', 'filename', 'original_filename', 'file_size', 'storage_path', 'status', 'created_at', 'updated_at']
+
+# Page size for paginated scans of potentially large result sets
+ATTEMPTS_PAGE_SIZE = 200
+
+# Hot single-document reads are cached per collection for a short time
+DOC_CACHE_TTL = 60
+DOC_CACHE_SIZE = 1024
+# PDF documents carry every content chunk (up to ~1 MiB each), so keep far fewer of them
+DOC_CACHE_SIZES = {PDFS: 32}
+_doc_cache: Dict[str, "OrderedDict[str, Tuple[float, Dict[str, Any]]]"] = {
+    PDFS: OrderedDict(),
+    QUIZZES: OrderedDict(),
+    USERS: OrderedDict(),
+    RECS: OrderedDict()
+}
+# Dashboard "recent attempts" tolerate a little staleness: user_id -> {(limit, fields): (expires, result)}
+RECENT_ATTEMPTS_TTL = 15
+_recent_attempts_cache: "OrderedDict[str, Dict[Tuple[int, Optional[Tuple[str, ...]]], Tuple[float, List[Any]]]]" = OrderedDict()
+# Reads currently in flight, so concurrent lookups of one document share an RPC; each read
+# runs in its own task so no single caller's cancellation can cancel it for the others
+_inflight: Dict[Tuple[str, str], "asyncio.Task[Optional[Dict[str, Any]]]"] = {}
 
 # Test storage for when database is not available
 test_storage = {
@@ -18,579 +63,815 @@ test_storage = {
     'recommendations': {},
     'notes': {}
 }
+# Secondary indexes over test_storage: kind -> field -> value -> ids
+_test_indexes = {
+    'quizzes': {'user_id': defaultdict(set)},
+    'notes': {'user_id': defaultdict(set), 'pdf_id': defaultdict(set)}
+}
 
-# Initialize Firestore with error handling
-db = None
-executor = ThreadPoolExecutor(max_workers=4)
+def _test_put(kind: str, doc_id: str, data: Dict[str, Any]) -> None:
+    """Store a document in test storage and keep its indexes current"""
+    _test_remove(kind, doc_id)
+    test_storage[kind][doc_id] = data
+    for field, index in _test_indexes.get(kind, {}).items():
+        index[data.get(field)].add(doc_id)
 
-if not settings.test_mode:
-    try:
-        db = firestore.client()
-        print("✅ Firestore initialized successfully")
-    except Exception as e:
-        print(f"⚠️  Firestore initialization failed: {e}")
-        print("📝 Using test mode storage instead")
-        db = None
-else:
-    print("🧪 Using test mode - in-memory storage")
+def _test_remove(kind: str, doc_id: str) -> bool:
+    """Remove a document from test storage and its indexes; True if it existed"""
+    data = test_storage[kind].pop(doc_id, None)
+    if data is None:
+        return False
+    for field, index in _test_indexes.get(kind, {}).items():
+        index[data.get(field)].discard(doc_id)
+    return True
+
+def _test_lookup(kind: str, **filters: str) -> List[Dict[str, Any]]:
+    """Documents in test storage matching all equality filters on indexed fields"""
+    indexes = _test_indexes[kind]
+    ids = set.intersection(*(indexes[field].get(value, set()) for field, value in filters.items()))
+    return [test_storage[kind][doc_id] for doc_id in ids]
+
+# Firestore client singleton. It is created lazily (normally from the FastAPI
+# startup hook, i.e. inside each worker process) and shared by every request so
+# the gRPC channel stays warm; never create per-request clients.
+_db = None
+_db_initialized = False
+_db_lock = threading.Lock()
+# CollectionReferences are built once per client and reused
+_collections: Dict[str, Any] = {}
+
+# Ordered base queries (collection, field, direction) built once per client;
+# Query objects are immutable, so per-request filters branch off a shared base
+_ordered_queries: Dict[Tuple[str, str, str], Any] = {}
+
+def get_db():
+    """Get the shared async Firestore client (None in test mode or on failure)"""
+    global _db, _db_initialized
+    if _db_initialized:
+        return _db
+    with _db_lock:
+        if not _db_initialized:
+            if not settings.test_mode:
+                try:
+                    _db = firestore_async.client()
+                    logger.info("✅ Firestore initialized successfully")
+                except Exception as e:
+                    logger.warning("⚠️  Firestore initialization failed: %s", e)
+                    logger.warning("📝 Using test mode storage instead")
+                    _db = None
+            else:
+                logger.info("🧪 Using test mode - in-memory storage")
+            _db_initialized = True
+    return _db
+
+def _collection(name: str):
+    """Get the shared CollectionReference for `name`"""
+    ref = _collections.get(name)
+    if ref is None:
+        ref = _collections[name] = get_db().collection(name)
+    return ref
+
+def _ordered(name: str, field: str, direction: str = firestore.Query.DESCENDING):
+    """Get the shared `name` query ordered by `field`"""
+    key = (name, field, direction)
+    query = _ordered_queries.get(key)
+    if query is None:
+        query = _ordered_queries[key] = _collection(name).order_by(field, direction=direction)
+    return query
+
+async def close_db() -> None:
+    """Close the shared Firestore client's channel (FastAPI shutdown hook)"""
+    global _db, _db_initialized
+    with _db_lock:
+        client, _db, _db_initialized = _db, None, False
+        _collections.clear()
+        _ordered_queries.clear()
+    # Only newer google-cloud-firestore releases expose close(); older clients are left
+    # for process exit to tear down rather than reaching into their private transport
+    close = getattr(client, 'close', None)
+    if close is not None:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+        logger.info("✅ Firestore client closed")
+
+def _cache_get(collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+    """Return cached document data if it hasn't expired"""
+    cache = _doc_cache[collection]
+    entry = cache.get(doc_id)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        del cache[doc_id]
+        return None
+    cache.move_to_end(doc_id)
+    return entry[1]
+
+def _cache_put(collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+    """Cache document data, purging expired entries and evicting the least recently used one when full"""
+    cache = _doc_cache[collection]
+    now = time.monotonic()
+    # Drop expired entries rather than holding them until they're read again or evicted
+    expired = [key for key, (expires, _) in cache.items() if expires < now]
+    for key in expired:
+        del cache[key]
+    cache[doc_id] = (now + DOC_CACHE_TTL, data)
+    cache.move_to_end(doc_id)
+    if len(cache) > DOC_CACHE_SIZES.get(collection, DOC_CACHE_SIZE):
+        cache.popitem(last=False)
+
+def _cache_pop(collection: str, doc_id: str) -> None:
+    """Drop a cached document after it was written or deleted"""
+    _doc_cache[collection].pop(doc_id, None)
+    # A read already in flight may return pre-write data; don't let it be shared or cached
+    _inflight.pop((collection, doc_id), None)
+
+async def _fetch_doc_data(collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+    """Read one document's data from Firestore"""
+    doc = await _collection(collection).document(doc_id).get()
+    return doc.to_dict() if doc.exists else None
+
+def _finish_fetch(key: Tuple[str, str], task: "asyncio.Task[Optional[Dict[str, Any]]]") -> None:
+    """Unregister a finished read and cache its result unless a write invalidated it meanwhile"""
+    if task.cancelled():
+        data = None
+    elif task.exception() is not None:  # also marks the exception retrieved if nobody awaited it
+        data = None
+    else:
+        data = task.result()
+    if _inflight.get(key) is task:
+        del _inflight[key]
+        if data is not None:
+            _cache_put(key[0], key[1], data)
+
+async def _get_doc_data(collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+    """Get document data via the TTL cache, coalescing concurrent reads of the same document"""
+    data = _cache_get(collection, doc_id)
+    if data is not None:
+        return data
+    key = (collection, doc_id)
+    task = _inflight.get(key)
+    if task is None:
+        task = _inflight[key] = asyncio.create_task(_fetch_doc_data(collection, doc_id))
+        task.add_done_callback(functools.partial(_finish_fetch, key))
+    # shield so a cancelled caller only stops waiting; the shared read carries on for the rest
+    return await asyncio.shield(task)
 
 # PDF Document Operations
-async def save_pdf_document(pdf_doc: PDFDocument) -> None:
-    """Save PDF document to Firestore (create if not exists)"""
-    def _save():
-        doc_ref = db.collection('pdfs').document(pdf_doc.id)
-        # Use set with merge=True to create if not exists, update if exists
-        doc_ref.set(pdf_doc.dict(), merge=True)
-        print(f"✅ Saved/Updated PDF document: {pdf_doc.id}")
-    
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(executor, _save)
+async def save_pdf_document(pdf_doc: PDFDocument, merge: bool = True) -> None:
+    """Save PDF document to Firestore (create if not exists)
+
+    Writes every field; use update_pdf_document when only a few fields changed.
+    """
+    doc_ref = _collection(PDFS).document(pdf_doc.id)
+    # With merge=True, set creates if not exists and updates if exists; merge=False replaces the doc
+    await doc_ref.set(pdf_doc.model_dump(), merge=merge)
+    _cache_pop(PDFS, pdf_doc.id)
+    logger.debug("✅ Saved/Updated PDF document: %s", pdf_doc.id)
 
 async def get_pdf_document(pdf_id: str) -> PDFDocument:
     """Get PDF document from Firestore"""
-    def _get():
-        doc_ref = db.collection('pdfs').document(pdf_id)
-        doc = doc_ref.get()
-        if doc.exists:
-            return PDFDocument(**doc.to_dict())
-        raise Exception("PDF not found")
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _get)
+    pdf_data = await _get_doc_data(PDFS, pdf_id)
+    if pdf_data is not None:
+        return PDFDocument.model_validate(pdf_data)
+    raise Exception("PDF not found")
 
 async def update_pdf_status(pdf_id: str, status: ProcessingStatus) -> None:
     """Update PDF processing status"""
-    def _update():
-        doc_ref = db.collection('pdfs').document(pdf_id)
-        doc_ref.update({
-            'status': status.value,
-            'updated_at': datetime.now()
-        })
-    
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(executor, _update)
+    doc_ref = _collection(PDFS).document(pdf_id)
+    await doc_ref.update({
+        'status': status.value,
+        'updated_at': firestore.SERVER_TIMESTAMP
+    })
+    _cache_pop(PDFS, pdf_id)
+
+async def update_pdf_document(pdf_id: str, fields: Dict[str, Any]) -> None:
+    """Update only the given fields of an existing PDF document (no read needed)"""
+    doc_ref = _collection(PDFS).document(pdf_id)
+    await doc_ref.update({**fields, 'updated_at': firestore.SERVER_TIMESTAMP})
+    _cache_pop(PDFS, pdf_id)
+
+# Study-note fields that older documents stored as ISO strings
+_DT_FIELDS = ('generated_at', 'created_at', 'updated_at')
+
+def _parse_legacy_dt(value: str) -> datetime:
+    """Parse an old ISO-string note date as an aware datetime
+
+    Firestore stores naive datetimes as UTC, so naive strings are read as UTC
+    too; that keeps them comparable with the timestamps newer notes come back as.
+    """
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+def _hydrate_notes(notes_data: Dict[str, Any]) -> StudyNotes:
+    """Build StudyNotes from Firestore data
+
+    Notes are now written with native timestamps; converting string dates
+    only keeps documents saved with the old format readable until
+    backfill_notes_timestamps has rewritten them.
+    """
+    for field in _DT_FIELDS:
+        value = notes_data.get(field)
+        if isinstance(value, str):
+            notes_data[field] = _parse_legacy_dt(value)
+    return StudyNotes.model_validate(notes_data)
+
+def _projected(doc) -> Dict[str, Any]:
+    """Plain dict for a document streamed with a .select() projection"""
+    data = doc.to_dict() or {}
+    data['id'] = doc.id
+    return data
 
-async def get_pdfs_by_user_id(user_id: str) -> List[PDFDocument]:
-    """Get all PDFs for a user"""
+def _test_project(data: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Mirror a Firestore .select(fields) projection (dotted paths included) on test data"""
+    result: Dict[str, Any] = {}
+    for path in fields:
+        parts = path.split('.')
+        value = data
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = result
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    result['id'] = data.get('id')
+    return result
+
+def _test_notes(fields: Optional[List[str]], **filters: str) -> List[Any]:
+    """Study notes from test storage (newest first), shaped like the Firestore reads"""
+    notes_data = sorted(_test_lookup('notes', **filters), key=lambda data: data['created_at'], reverse=True)
+    if fields is not None:
+        return [_test_project(data, fields) for data in notes_data]
+    return [StudyNotes.model_validate(data) for data in notes_data]
+
+async def iter_pdfs_by_user_id(user_id: str) -> AsyncIterator[PDFDocument]:
+    """Yield a user's PDFs (newest first) as they stream in, skipping unparsable ones"""
+    docs = _ordered(PDFS, 'created_at').where('user_id', '==', user_id).stream()
+    validate = PDFDocument.model_validate
+    async for doc in docs:
+        try:
+            pdf_data = doc.to_dict()
+            pdf_doc = validate(pdf_data)
+        except Exception as e:
+            logger.warning("⚠️  Error parsing PDF document %s: %s", doc.id, e)
+            continue
+        yield pdf_doc
+
+async def get_pdfs_by_user_id(user_id: str, fields: Optional[List[str]] = None) -> Union[List[PDFDocument], List[PDFDocumentSummary]]:
+    """Get all PDFs for a user (summaries holding just `fields` when given)"""
     try:
-        def _get():
-            docs = db.collection('pdfs').where('user_id', '==', user_id).order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-            pdf_list = []
-            for doc in docs:
+        query = _ordered(PDFS, 'created_at').where('user_id', '==', user_id)
+        if fields is not None:
+            validate = PDFDocumentSummary.model_validate
+            result = []
+            async for doc in query.select(fields).stream():
                 try:
-                    pdf_data = doc.to_dict()
-                    pdf_list.append(PDFDocument(**pdf_data))
+                    result.append(validate(_projected(doc)))
                 except Exception as e:
-                    print(f"⚠️  Error parsing PDF document {doc.id}: {e}")
+                    logger.warning("⚠️  Error parsing PDF document %s: %s", doc.id, e)
                     continue
-            return pdf_list
-        
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(executor, _get)
-        print(f"✅ Retrieved {len(result)} PDFs for user {user_id}")
+            logger.debug("✅ Retrieved %s PDFs for user %s", len(result), user_id)
+            return result
+        result = [pdf_doc async for pdf_doc in iter_pdfs_by_user_id(user_id)]
+        logger.debug("✅ Retrieved %s PDFs for user %s", len(result), user_id)
         return result
         
     except Exception as e:
-        print(f"❌ Error retrieving PDFs for user {user_id}: {e}")
+        logger.error("❌ Error retrieving PDFs for user %s: %s", user_id, e)
         return []
 
+async def _delete_refs_batched(refs: List[Any]) -> None:
+    """Delete document references using as few batch commits as possible"""
+    commits = []
+    for start in range(0, len(refs), FIRESTORE_BATCH_LIMIT):
+        batch = get_db().batch()
+        for ref in refs[start:start + FIRESTORE_BATCH_LIMIT]:
+            batch.delete(ref)
+        commits.append(batch.commit())
+    await asyncio.gather(*commits)
+
+async def _delete_quizzes_and_attempts(pdf_id: str) -> Tuple[int, int]:
+    """Delete a PDF's quizzes and their attempts, returning (quizzes, attempts) counts"""
+    # Keys only, payloads aren't needed
+    quizzes = _collection(QUIZZES).where('pdf_id', '==', pdf_id).select([]).stream()
+    quiz_refs = [quiz.reference async for quiz in quizzes]
+    quiz_ids = [ref.id for ref in quiz_refs]
+    
+    # One attempts query per FIRESTORE_IN_LIMIT quizzes instead of one per quiz
+    async def _attempt_refs(ids: List[str]) -> List[Any]:
+        attempts = _collection(ATTEMPTS).where('quiz_id', 'in', ids).select([]).stream()
+        return [attempt.reference async for attempt in attempts]
+    
+    attempt_chunks = await asyncio.gather(*(
+        _attempt_refs(quiz_ids[start:start + FIRESTORE_IN_LIMIT])
+        for start in range(0, len(quiz_ids), FIRESTORE_IN_LIMIT)
+    ))
+    attempt_refs = [ref for chunk in attempt_chunks for ref in chunk]
+    quiz_count = len(quiz_refs)
+    attempt_count = len(attempt_refs)
+    
+    await _delete_refs_batched(attempt_refs + quiz_refs)
+    for quiz_id in quiz_ids:
+        _cache_pop(QUIZZES, quiz_id)
+    if attempt_count:
+        # Attempt owners aren't fetched (keys-only), so drop every cached recent list
+        _recent_attempts_cache.clear()
+    return quiz_count, attempt_count
+
+async def _delete_pdf_notes(pdf_id: str) -> int:
+    """Delete a PDF's study notes, returning how many were removed"""
+    notes = _collection(NOTES).where('pdf_id', '==', pdf_id).select([]).stream()
+    refs_to_delete = [note.reference async for note in notes]
+    await _delete_refs_batched(refs_to_delete)
+    return len(refs_to_delete)
+
 async def delete_pdf_document(pdf_id: str) -> None:
     """Delete PDF document and all related data"""
     try:
-        def _delete():
-            print(f"🗑️  Starting deletion of PDF {pdf_id}")
-            
-            # Count and delete related data
-            deleted_counts = {
-                'quizzes': 0,
-                'quiz_attempts': 0,
-                'study_notes': 0
-            }
-            
-            # Delete related quizzes and their attempts
-            quizzes = db.collection('quizzes').where('pdf_id', '==', pdf_id).stream()
-            for quiz in quizzes:
-                quiz_id = quiz.id
-                
-                # Delete quiz attempts for this quiz
-                attempts = db.collection('quiz_attempts').where('quiz_id', '==', quiz_id).stream()
-                for attempt in attempts:
-                    attempt.reference.delete()
-                    deleted_counts['quiz_attempts'] += 1
-                
-                # Delete the quiz
-                quiz.reference.delete()
-                deleted_counts['quizzes'] += 1
-            
-            # Delete related study notes
-            notes = db.collection('study_notes').where('pdf_id', '==', pdf_id).stream()
-            for note in notes:
-                note.reference.delete()
-                deleted_counts['study_notes'] += 1
-            
-            # Delete the PDF document
-            db.collection('pdfs').document(pdf_id).delete()
-            
-            print(f"✅ Deleted PDF {pdf_id} and related data:")
-            print(f"   📄 PDF: 1")
-            print(f"   🎯 Quizzes: {deleted_counts['quizzes']}")
-            print(f"   📝 Quiz Attempts: {deleted_counts['quiz_attempts']}")
-            print(f"   📚 Study Notes: {deleted_counts['study_notes']}")
-            
-            return deleted_counts
+        logger.debug("🗑️  Starting deletion of PDF %s", pdf_id)
         
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(executor, _delete)
-        return result
+        # Related collections are independent, so clean them up concurrently
+        (quiz_count, attempt_count), notes_count = await asyncio.gather(
+            _delete_quizzes_and_attempts(pdf_id),
+            _delete_pdf_notes(pdf_id)
+        )
+        deleted_counts = {
+            'quizzes': quiz_count,
+            'quiz_attempts': attempt_count,
+            'study_notes': notes_count
+        }
+        
+        # Delete the PDF document only once its related data is gone
+        await _collection(PDFS).document(pdf_id).delete()
+        _cache_pop(PDFS, pdf_id)
+        
+        logger.info(
+            "✅ Deleted PDF %s and related data: 🎯 %d quizzes, 📝 %d quiz attempts, 📚 %d study notes",
+            pdf_id, deleted_counts['quizzes'], deleted_counts['quiz_attempts'], deleted_counts['study_notes']
+        )
+        
+        return deleted_counts
         
     except Exception as e:
-        print(f"❌ Error deleting PDF {pdf_id}: {e}")
+        logger.error("❌ Error deleting PDF %s: %s", pdf_id, e)
         raise Exception(f"Failed to delete PDF: {str(e)}")
 
 # Quiz Operations
 async def save_quiz(quiz: Quiz) -> None:
     """Save quiz to Firestore (create if not exists)"""
-    def _save():
-        doc_ref = db.collection('quizzes').document(quiz.id)
-        quiz_data = quiz.dict()
-        # Convert questions to dict format
-        quiz_data['questions'] = [q.dict() for q in quiz.questions]
-        # Use set with merge=True to create if not exists, update if exists
-        doc_ref.set(quiz_data, merge=True)
-        print(f"✅ Saved/Updated quiz: {quiz.id}")
-    
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(executor, _save)
+    doc_ref = _collection(QUIZZES).document(quiz.id)
+    # model_dump() already serializes the nested questions
+    quiz_data = quiz.model_dump()
+    # Use set with merge=True to create if not exists, update if exists
+    await doc_ref.set(quiz_data, merge=True)
+    _cache_pop(QUIZZES, quiz.id)
+    logger.debug("✅ Saved/Updated quiz: %s", quiz.id)
 
 async def get_quiz(quiz_id: str) -> Quiz:
     """Get quiz from Firestore"""
-    def _get():
-        doc_ref = db.collection('quizzes').document(quiz_id)
-        doc = doc_ref.get()
-        if doc.exists:
-            quiz_data = doc.to_dict()
-            return Quiz(**quiz_data)
-        raise Exception("Quiz not found")
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _get)
+    quiz_data = await _get_doc_data(QUIZZES, quiz_id)
+    if quiz_data is not None:
+        return Quiz.model_validate(quiz_data)
+    raise Exception("Quiz not found")
 
-async def get_quizzes_by_user_id(user_id: str) -> List[Quiz]:
-    """Get all quizzes created by a user"""
-    if settings.test_mode or db is None:
+async def get_quizzes_by_user_id(user_id: str, fields: Optional[List[str]] = None) -> Union[List[Quiz], List[Dict[str, Any]]]:
+    """Get all quizzes created by a user (lightweight dicts of just `fields` when given)"""
+    if settings.test_mode or get_db() is None:
         # Use in-memory storage for testing
         user_quizzes = []
-        for quiz_data in test_storage.get('quizzes', {}).values():
-            if quiz_data.get('user_id') == user_id:
-                user_quizzes.append(Quiz(**quiz_data))
+        for quiz_data in _test_lookup('quizzes', user_id=user_id):
+            if fields is not None:
+                user_quizzes.append({**{f: quiz_data.get(f) for f in fields}, 'id': quiz_data.get('id')})
+            else:
+                user_quizzes.append(Quiz.model_validate(quiz_data))
         return user_quizzes
     
-    def _get():
-        docs = db.collection('quizzes').where('user_id', '==', user_id).stream()
-        return [Quiz(**doc.to_dict()) for doc in docs]
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _get)
+    if fields is not None:
+        query = _collection(QUIZZES).where('user_id', '==', user_id).select(fields)
+        return [_projected(doc) async for doc in query.stream()]
+    return [quiz async for quiz in iter_quizzes_by_user_id(user_id)]
+
+async def iter_quizzes_by_user_id(user_id: str) -> AsyncIterator[Quiz]:
+    """Yield quizzes created by a user as they stream in"""
+    docs = _collection(QUIZZES).where('user_id', '==', user_id).stream()
+    validate = Quiz.model_validate
+    async for doc in docs:
+        yield validate(doc.to_dict())
+
+async def iter_quizzes_by_pdf_id(pdf_id: str) -> AsyncIterator[Quiz]:
+    """Yield quizzes for a PDF as they stream in"""
+    docs = _collection(QUIZZES).where('pdf_id', '==', pdf_id).stream()
+    validate = Quiz.model_validate
+    async for doc in docs:
+        yield validate(doc.to_dict())
 
 async def get_quizzes_by_pdf_id(pdf_id: str) -> List[Quiz]:
     """Get all quizzes for a PDF"""
-    def _get():
-        docs = db.collection('quizzes').where('pdf_id', '==', pdf_id).stream()
-        return [Quiz(**doc.to_dict()) for doc in docs]
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _get)
+    return [quiz async for quiz in iter_quizzes_by_pdf_id(pdf_id)]
 
 # Quiz Attempt Operations
 async def save_quiz_attempt(attempt: QuizAttempt) -> None:
     """Save quiz attempt to Firestore (create if not exists)"""
-    def _save():
-        doc_ref = db.collection('quiz_attempts').document(attempt.id)
-        # Use set with merge=True to create if not exists, update if exists
-        doc_ref.set(attempt.dict(), merge=True)
-        print(f"✅ Saved/Updated quiz attempt: {attempt.id}")
-    
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(executor, _save)
+    doc_ref = _collection(ATTEMPTS).document(attempt.id)
+    # Use set with merge=True to create if not exists, update if exists
+    await doc_ref.set(attempt.model_dump(), merge=True)
+    _recent_attempts_cache.pop(attempt.user_id, None)
+    logger.debug("✅ Saved/Updated quiz attempt: %s", attempt.id)
 
 async def get_quiz_attempt(attempt_id: str) -> QuizAttempt:
     """Get quiz attempt from Firestore"""
-    def _get():
-        doc_ref = db.collection('quiz_attempts').document(attempt_id)
-        doc = doc_ref.get()
-        if doc.exists:
-            return QuizAttempt(**doc.to_dict())
-        raise Exception("Quiz attempt not found")
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _get)
+    doc_ref = _collection(ATTEMPTS).document(attempt_id)
+    doc = await doc_ref.get()
+    if doc.exists:
+        return QuizAttempt.model_validate(doc.to_dict())
+    raise Exception("Quiz attempt not found")
+
+async def iter_user_quiz_attempts(user_id: str, quiz_id: str) -> AsyncIterator[QuizAttempt]:
+    """Yield a user's attempts at a quiz (newest first) as they stream in"""
+    docs = (_ordered(ATTEMPTS, 'created_at')
+            .where('user_id', '==', user_id)
+            .where('quiz_id', '==', quiz_id)
+            .stream())
+    validate = QuizAttempt.model_validate
+    async for doc in docs:
+        yield validate(doc.to_dict())
 
 async def get_user_quiz_attempts(user_id: str, quiz_id: str) -> List[QuizAttempt]:
     """Get all attempts for a specific quiz by a user"""
-    def _get():
-        docs = (db.collection('quiz_attempts')
-                .where('user_id', '==', user_id)
-                .where('quiz_id', '==', quiz_id)
-                .order_by('created_at', direction=firestore.Query.DESCENDING)
-                .stream())
-        return [QuizAttempt(**doc.to_dict()) for doc in docs]
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _get)
+    return [attempt async for attempt in iter_user_quiz_attempts(user_id, quiz_id)]
 
-async def get_recent_quiz_attempts(user_id: str, limit: int = 10) -> List[QuizAttempt]:
-    """Get recent quiz attempts for a user"""
-    def _get():
-        docs = (db.collection('quiz_attempts')
-                .where('user_id', '==', user_id)
-                .order_by('completed_at', direction=firestore.Query.DESCENDING)
-                .limit(limit)
-                .stream())
-        return [QuizAttempt(**doc.to_dict()) for doc in docs]
+async def iter_recent_quiz_attempts(user_id: str, limit: int = 10) -> AsyncIterator[QuizAttempt]:
+    """Yield a user's most recent quiz attempts as they stream in (uncached)"""
+    docs = (_ordered(ATTEMPTS, 'completed_at')
+            .where('user_id', '==', user_id)
+            .limit(limit)
+            .stream())
+    validate = QuizAttempt.model_validate
+    async for doc in docs:
+        yield validate(doc.to_dict())
+
+async def get_recent_quiz_attempts(user_id: str, limit: int = 10, fields: Optional[List[str]] = None, bypass_cache: bool = False) -> Union[List[QuizAttempt], List[Dict[str, Any]]]:
+    """Get recent quiz attempts for a user (lightweight dicts of just `fields` when given)"""
+    key = (limit, tuple(fields) if fields is not None else None)
+    if not bypass_cache:
+        entry = _recent_attempts_cache.get(user_id, {}).get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return list(entry[1])
+    
+    if fields is not None:
+        query = (_ordered(ATTEMPTS, 'completed_at')
+                 .where('user_id', '==', user_id)
+                 .limit(limit)
+                 .select(fields))
+        result = [_projected(doc) async for doc in query.stream()]
+    else:
+        result = [attempt async for attempt in iter_recent_quiz_attempts(user_id, limit)]
     
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _get)
+    _recent_attempts_cache.setdefault(user_id, {})[key] = (time.monotonic() + RECENT_ATTEMPTS_TTL, result)
+    _recent_attempts_cache.move_to_end(user_id)
+    if len(_recent_attempts_cache) > DOC_CACHE_SIZE:
+        _recent_attempts_cache.popitem(last=False)
+    return list(result)
+
+async def iter_all_quiz_attempts_by_user(user_id: str, page_size: int = ATTEMPTS_PAGE_SIZE) -> AsyncIterator[QuizAttempt]:
+    """Yield all quiz attempts for a user (oldest first), fetching one page at a time"""
+    query = (_ordered(ATTEMPTS, 'completed_at', firestore.Query.ASCENDING)
+             .where('user_id', '==', user_id)
+             .limit(page_size))
+    validate = QuizAttempt.model_validate
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc is not None else query
+        fetched = 0
+        async for doc in page.stream():
+            fetched += 1
+            last_doc = doc
+            yield validate(doc.to_dict())
+        if fetched < page_size:
+            return
+
+async def _fetch_page(collection: str, query, page_size: int, start_after: Optional[str]) -> Tuple[List[Any], Optional[str]]:
+    """One page of `query` after document id `start_after`, plus the next page's cursor"""
+    if start_after is not None:
+        cursor_doc = await _collection(collection).document(start_after).get()
+        if not cursor_doc.exists:
+            raise Exception("Page cursor not found")
+        query = query.start_after(cursor_doc)
+    docs = [doc async for doc in query.limit(page_size).stream()]
+    next_cursor = docs[-1].id if len(docs) == page_size else None
+    return docs, next_cursor
+
+async def get_quiz_attempts_page(user_id: str, page_size: int = ATTEMPTS_PAGE_SIZE, start_after: Optional[str] = None) -> Tuple[List[QuizAttempt], Optional[str]]:
+    """Get one page of a user's quiz attempts (oldest first) and the cursor for the next page"""
+    query = (_ordered(ATTEMPTS, 'completed_at', firestore.Query.ASCENDING)
+             .where('user_id', '==', user_id))
+    docs, next_cursor = await _fetch_page(ATTEMPTS, query, page_size, start_after)
+    validate = QuizAttempt.model_validate
+    return [validate(doc.to_dict()) for doc in docs], next_cursor
 
 async def get_all_quiz_attempts_by_user(user_id: str) -> List[QuizAttempt]:
     """Get all quiz attempts for a user"""
-    def _get():
-        docs = (db.collection('quiz_attempts')
-                .where('user_id', '==', user_id)
-                .order_by('completed_at', direction=firestore.Query.ASCENDING)
-                .stream())
-        return [QuizAttempt(**doc.to_dict()) for doc in docs]
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _get)
+    return [attempt async for attempt in iter_all_quiz_attempts_by_user(user_id)]
 
 # User Operations
 async def save_user(user: User) -> None:
     """Save user to Firestore (create if not exists)"""
-    def _save():
-        doc_ref = db.collection('users').document(user.uid)
-        # Use set with merge=True to create if not exists, update if exists
-        doc_ref.set(user.dict(), merge=True)
-        print(f"✅ Saved/Updated user: {user.uid}")
-    
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(executor, _save)
+    doc_ref = _collection(USERS).document(user.uid)
+    # Use set with merge=True to create if not exists, update if exists
+    await doc_ref.set(user.model_dump(), merge=True)
+    _cache_pop(USERS, user.uid)
+    logger.debug("✅ Saved/Updated user: %s", user.uid)
 
 async def get_user(user_id: str) -> Optional[User]:
     """Get user from Firestore"""
-    def _get():
-        doc_ref = db.collection('users').document(user_id)
-        doc = doc_ref.get()
-        if doc.exists:
-            return User(**doc.to_dict())
-        return None
+    user_data = await _get_doc_data(USERS, user_id)
+    if user_data is not None:
+        return User.model_validate(user_data)
+    return None
+
+# Composite reads (independent lookups run concurrently)
+async def get_pdf_bundle(pdf_id: str, user_id: str) -> Tuple[PDFDocument, List[Quiz], Optional[User]]:
+    """Get a PDF together with its quizzes and the requesting user"""
+    pdf_doc, quizzes, user = await asyncio.gather(
+        get_pdf_document(pdf_id),
+        get_quizzes_by_pdf_id(pdf_id),
+        get_user(user_id)
+    )
+    return pdf_doc, quizzes, user
+
+async def get_quiz_with_attempts(quiz_id: str, user_id: str) -> Tuple[Quiz, List[QuizAttempt]]:
+    """Get a quiz together with the user's attempts at it"""
+    quiz, attempts = await asyncio.gather(
+        get_quiz(quiz_id),
+        get_user_quiz_attempts(user_id, quiz_id)
+    )
+    return quiz, attempts
+
+async def get_many(collection: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Get several documents of one collection in a single batched read (id -> data)"""
+    cached = collection in _doc_cache
+    found = {}
+    missing = []
+    for doc_id in dict.fromkeys(ids):
+        data = _cache_get(collection, doc_id) if cached else None
+        if data is not None:
+            found[doc_id] = data
+        else:
+            missing.append(doc_id)
     
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _get)
+    if missing:
+        refs = [_collection(collection).document(doc_id) for doc_id in missing]
+        async for doc in get_db().get_all(refs):
+            if doc.exists:
+                data = doc.to_dict()
+                found[doc.id] = data
+                if cached:
+                    _cache_put(collection, doc.id, data)
+    return found
+
+async def get_quizzes_by_ids(quiz_ids: List[str]) -> Dict[str, Quiz]:
+    """Get quizzes by id with one batched read (missing ids are left out)"""
+    validate = Quiz.model_validate
+    return {quiz_id: validate(data) for quiz_id, data in (await get_many(QUIZZES, quiz_ids)).items()}
+
+async def get_pdf_documents_by_ids(pdf_ids: List[str]) -> Dict[str, PDFDocument]:
+    """Get PDF documents by id with one batched read (missing ids are left out)"""
+    validate = PDFDocument.model_validate
+    return {pdf_id: validate(data) for pdf_id, data in (await get_many(PDFS, pdf_ids)).items()}
+
+async def get_attempt_with_quiz(attempt_id: str) -> Tuple[QuizAttempt, Quiz]:
+    """Get a quiz attempt together with the quiz it belongs to"""
+    attempt = await get_quiz_attempt(attempt_id)
+    return attempt, await get_quiz(attempt.quiz_id)
 
 # Analytics and Recommendations
 async def save_user_recommendation(user_id: str, recommendations: List[str]) -> None:
     """Save user recommendations"""
-    def _save():
-        doc_ref = db.collection('recommendations').document(user_id)
-        doc_ref.set({
-            'user_id': user_id,
-            'recommendations': recommendations,
-            'created_at': datetime.now(),
-            'updated_at': datetime.now()
-        })
-    
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(executor, _save)
+    doc_ref = _collection(RECS).document(user_id)
+    await doc_ref.set({
+        'user_id': user_id,
+        'recommendations': recommendations,
+        'created_at': firestore.SERVER_TIMESTAMP,
+        'updated_at': firestore.SERVER_TIMESTAMP
+    })
+    _cache_pop(RECS, user_id)
 
 async def get_user_recommendations(user_id: str) -> Optional[Dict[str, Any]]:
     """Get user recommendations"""
-    def _get():
-        doc_ref = db.collection('recommendations').document(user_id)
-        doc = doc_ref.get()
-        if doc.exists:
-            return doc.to_dict()
-        return None
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _get)
+    recommendations = await _get_doc_data(RECS, user_id)
+    if recommendations is not None:
+        return dict(recommendations)
+    return None
 
 # Study Notes Operations
 async def save_user_notes(notes) -> None:
     """Save study notes to Firebase Firestore"""
     try:
         # Always try to save to Firebase first
-        def _save():
-            doc_ref = db.collection('study_notes').document(notes.id)
-            notes_data = notes.dict()
-            
-            # Convert datetime objects to strings for Firestore
-            if 'generated_at' in notes_data and hasattr(notes_data['generated_at'], 'isoformat'):
-                notes_data['generated_at'] = notes_data['generated_at'].isoformat()
-            if 'created_at' in notes_data and hasattr(notes_data['created_at'], 'isoformat'):
-                notes_data['created_at'] = notes_data['created_at'].isoformat()
-            if 'updated_at' in notes_data and hasattr(notes_data['updated_at'], 'isoformat'):
-                notes_data['updated_at'] = notes_data['updated_at'].isoformat()
-            
-            doc_ref.set(notes_data)
-            print(f"✅ Saved study notes {notes.id} to Firebase Firestore")
+        doc_ref = _collection(NOTES).document(notes.id)
+        notes_data = notes.model_dump()
         
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(executor, _save)
+        # datetimes are stored as native Firestore timestamps
+        await doc_ref.set(notes_data)
+        logger.debug("✅ Saved study notes %s to Firebase Firestore", notes.id)
         
     except Exception as e:
-        print(f"❌ Error saving to Firebase: {e}")
+        logger.error("❌ Error saving to Firebase: %s", e)
         # Fallback to test storage
-        test_storage['notes'] = test_storage.get('notes', {})
-        test_storage['notes'][notes.id] = notes.dict()
-        print(f"📝 Saved study notes {notes.id} to test storage (fallback)")
+        _test_put('notes', notes.id, notes.model_dump())
+        logger.warning("📝 Saved study notes %s to test storage (fallback)", notes.id)
         raise e
 
 async def get_user_notes(notes_id: str):
     """Get study notes by ID from Firebase Firestore"""
     try:
-        def _get():
-            doc_ref = db.collection('study_notes').document(notes_id)
-            doc = doc_ref.get()
-            if doc.exists:
-                from models.notes import StudyNotes
-                notes_data = doc.to_dict()
-                
-                # Convert string dates back to datetime objects
-                if 'generated_at' in notes_data and isinstance(notes_data['generated_at'], str):
-                    from datetime import datetime
-                    notes_data['generated_at'] = datetime.fromisoformat(notes_data['generated_at'])
-                if 'created_at' in notes_data and isinstance(notes_data['created_at'], str):
-                    from datetime import datetime
-                    notes_data['created_at'] = datetime.fromisoformat(notes_data['created_at'])
-                if 'updated_at' in notes_data and isinstance(notes_data['updated_at'], str):
-                    from datetime import datetime
-                    notes_data['updated_at'] = datetime.fromisoformat(notes_data['updated_at'])
-                
-                return StudyNotes(**notes_data)
-            return None
-        
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(executor, _get)
+        result = None
+        doc_ref = _collection(NOTES).document(notes_id)
+        doc = await doc_ref.get()
+        if doc.exists:
+            result = _hydrate_notes(doc.to_dict())
         if result:
-            print(f"✅ Retrieved study notes {notes_id} from Firebase")
+            logger.debug("✅ Retrieved study notes %s from Firebase", notes_id)
         return result
         
     except Exception as e:
-        print(f"❌ Error retrieving from Firebase: {e}")
+        logger.error("❌ Error retrieving from Firebase: %s", e)
         # Fallback to test storage
         notes_data = test_storage.get('notes', {}).get(notes_id)
         if notes_data:
-            from models.notes import StudyNotes
-            return StudyNotes(**notes_data)
+            return StudyNotes.model_validate(notes_data)
         return None
 
-async def get_notes_by_pdf_id(pdf_id: str, user_id: str) -> List:
-    """Get all notes for a specific PDF from Firebase Firestore"""
+async def get_notes_by_pdf_id(pdf_id: str, user_id: str, fields: Optional[List[str]] = None) -> List:
+    """Get all notes for a specific PDF from Firebase Firestore (dicts of just `fields` when given)"""
     try:
-        def _get():
-            docs = (db.collection('study_notes')
-                    .where('pdf_id', '==', pdf_id)
-                    .where('user_id', '==', user_id)
-                    .order_by('created_at', direction=firestore.Query.DESCENDING)
-                    .stream())
-            
-            from models.notes import StudyNotes
-            notes_list = []
-            
-            for doc in docs:
-                notes_data = doc.to_dict()
-                
-                # Convert string dates back to datetime objects
-                if 'generated_at' in notes_data and isinstance(notes_data['generated_at'], str):
-                    from datetime import datetime
-                    notes_data['generated_at'] = datetime.fromisoformat(notes_data['generated_at'])
-                if 'created_at' in notes_data and isinstance(notes_data['created_at'], str):
-                    from datetime import datetime
-                    notes_data['created_at'] = datetime.fromisoformat(notes_data['created_at'])
-                if 'updated_at' in notes_data and isinstance(notes_data['updated_at'], str):
-                    from datetime import datetime
-                    notes_data['updated_at'] = datetime.fromisoformat(notes_data['updated_at'])
-                
-                notes_list.append(StudyNotes(**notes_data))
-            
-            return notes_list
+        query = (_ordered(NOTES, 'created_at')
+                 .where('pdf_id', '==', pdf_id)
+                 .where('user_id', '==', user_id))
+        if fields is not None:
+            result = [_projected(doc) async for doc in query.select(fields).stream()]
+            logger.debug("✅ Retrieved %s notes for PDF %s from Firebase", len(result), pdf_id)
+            return result
+        result = [_hydrate_notes(doc.to_dict()) async for doc in query.stream()]
         
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(executor, _get)
-        print(f"✅ Retrieved {len(result)} notes for PDF {pdf_id} from Firebase")
+        logger.debug("✅ Retrieved %s notes for PDF %s from Firebase", len(result), pdf_id)
         return result
         
     except Exception as e:
-        print(f"❌ Error retrieving notes by PDF ID from Firebase: {e}")
+        logger.error("❌ Error retrieving notes by PDF ID from Firebase: %s", e)
         # Fallback to test storage
-        notes_list = []
-        for notes_data in test_storage.get('notes', {}).values():
-            if notes_data.get('pdf_id') == pdf_id and notes_data.get('user_id') == user_id:
-                from models.notes import StudyNotes
-                notes_list.append(StudyNotes(**notes_data))
-        return notes_list
+        return _test_notes(fields, pdf_id=pdf_id, user_id=user_id)
+
+async def iter_all_user_notes(user_id: str) -> AsyncIterator[StudyNotes]:
+    """Yield a user's study notes (newest first) from Firestore as they stream in"""
+    docs = (_ordered(NOTES, 'created_at')
+            .where('user_id', '==', user_id)
+            .stream())
+    async for doc in docs:
+        yield _hydrate_notes(doc.to_dict())
 
-async def get_all_user_notes_from_db(user_id: str) -> List[Any]:
-    """Get all study notes for a user from Firebase Firestore"""
-    if settings.test_mode or db is None:
+async def get_user_notes_page(user_id: str, page_size: int = ATTEMPTS_PAGE_SIZE, start_after: Optional[str] = None) -> Tuple[List[StudyNotes], Optional[str]]:
+    """Get one page of a user's study notes (newest first) and the cursor for the next page"""
+    query = (_ordered(NOTES, 'created_at')
+             .where('user_id', '==', user_id))
+    docs, next_cursor = await _fetch_page(NOTES, query, page_size, start_after)
+    return [_hydrate_notes(doc.to_dict()) for doc in docs], next_cursor
+
+async def get_all_user_notes_from_db(user_id: str, fields: Optional[List[str]] = None) -> List[Any]:
+    """Get all study notes for a user from Firebase Firestore (dicts of just `fields` when given)"""
+    if settings.test_mode or get_db() is None:
         # Use in-memory storage for testing
-        notes_list = []
-        for notes_data in test_storage.get('notes', {}).values():
-            if notes_data.get('user_id') == user_id:
-                from models.notes import StudyNotes
-                notes_list.append(StudyNotes(**notes_data))
-        # Sort by created_at
-        notes_list.sort(key=lambda x: x.created_at, reverse=True)
-        print(f"📝 Retrieved {len(notes_list)} notes for user {user_id} from test storage")
+        notes_list = _test_notes(fields, user_id=user_id)
+        logger.debug("📝 Retrieved %s notes for user %s from test storage", len(notes_list), user_id)
         return notes_list
     
     try:
-        def _get():
-            docs = (db.collection('study_notes')
-                    .where('user_id', '==', user_id)
-                    .order_by('created_at', direction=firestore.Query.DESCENDING)
-                    .stream())
-            
-            from models.notes import StudyNotes
-            notes_list = []
-            
-            for doc in docs:
-                notes_data = doc.to_dict()
-                
-                # Convert string dates back to datetime objects
-                if 'generated_at' in notes_data and isinstance(notes_data['generated_at'], str):
-                    from datetime import datetime
-                    notes_data['generated_at'] = datetime.fromisoformat(notes_data['generated_at'])
-                if 'created_at' in notes_data and isinstance(notes_data['created_at'], str):
-                    from datetime import datetime
-                    notes_data['created_at'] = datetime.fromisoformat(notes_data['created_at'])
-                if 'updated_at' in notes_data and isinstance(notes_data['updated_at'], str):
-                    from datetime import datetime
-                    notes_data['updated_at'] = datetime.fromisoformat(notes_data['updated_at'])
-                
-                notes_list.append(StudyNotes(**notes_data))
-            
-            return notes_list
+        if fields is not None:
+            query = (_ordered(NOTES, 'created_at')
+                     .where('user_id', '==', user_id)
+                     .select(fields))
+            result = [_projected(doc) async for doc in query.stream()]
+        else:
+            result = [notes async for notes in iter_all_user_notes(user_id)]
         
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(executor, _get)
-        print(f"✅ Retrieved {len(result)} total notes for user {user_id} from Firebase")
+        logger.debug("✅ Retrieved %s total notes for user %s from Firebase", len(result), user_id)
         return result
         
     except Exception as e:
-        print(f"❌ Error retrieving all user notes from Firebase: {e}")
+        logger.error("❌ Error retrieving all user notes from Firebase: %s", e)
         # Fallback to test storage
-        notes_list = []
-        for notes_data in test_storage.get('notes', {}).values():
-            if notes_data.get('user_id') == user_id:
-                from models.notes import StudyNotes
-                notes_list.append(StudyNotes(**notes_data))
-        # Sort by created_at
-        notes_list.sort(key=lambda x: x.created_at, reverse=True)
-        return notes_list
+        return _test_notes(fields, user_id=user_id)
 async  def update_user_notes(notes) -> None:
     """Update existing study notes in Firebase Firestore"""
     try:
-        def _update():
-            doc_ref = db.collection('study_notes').document(notes.id)
-            notes_data = notes.dict()
-            
-            # Convert datetime objects to strings for Firestore
-            if 'generated_at' in notes_data and hasattr(notes_data['generated_at'], 'isoformat'):
-                notes_data['generated_at'] = notes_data['generated_at'].isoformat()
-            if 'created_at' in notes_data and hasattr(notes_data['created_at'], 'isoformat'):
-                notes_data['created_at'] = notes_data['created_at'].isoformat()
-            if 'updated_at' in notes_data and hasattr(notes_data['updated_at'], 'isoformat'):
-                notes_data['updated_at'] = notes_data['updated_at'].isoformat()
-            
-            # Update the updated_at timestamp
-            from datetime import datetime
-            notes_data['updated_at'] = datetime.now().isoformat()
-            
-            doc_ref.update(notes_data)
-            print(f"✅ Updated study notes {notes.id} in Firebase Firestore")
+        doc_ref = _collection(NOTES).document(notes.id)
+        notes_data = notes.model_dump()
         
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(executor, _update)
+        # Let Firestore stamp updated_at with server time
+        notes_data['updated_at'] = firestore.SERVER_TIMESTAMP
+        
+        await doc_ref.update(notes_data)
+        logger.debug("✅ Updated study notes %s in Firebase Firestore", notes.id)
         
     except Exception as e:
-        print(f"❌ Error updating notes in Firebase: {e}")
+        logger.error("❌ Error updating notes in Firebase: %s", e)
         # Fallback to test storage
-        test_storage['notes'] = test_storage.get('notes', {})
-        test_storage['notes'][notes.id] = notes.dict()
-        print(f"📝 Updated study notes {notes.id} in test storage (fallback)")
+        _test_put('notes', notes.id, notes.model_dump())
+        logger.warning("📝 Updated study notes %s in test storage (fallback)", notes.id)
         raise e
 
 async def delete_user_notes(notes_id: str) -> None:
     """Delete study notes from Firebase Firestore"""
     try:
-        def _delete():
-            doc_ref = db.collection('study_notes').document(notes_id)
-            doc_ref.delete()
-            print(f"✅ Deleted study notes {notes_id} from Firebase Firestore")
-        
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(executor, _delete)
+        doc_ref = _collection(NOTES).document(notes_id)
+        await doc_ref.delete()
+        logger.debug("✅ Deleted study notes %s from Firebase Firestore", notes_id)
         
     except Exception as e:
-        print(f"❌ Error deleting notes from Firebase: {e}")
+        logger.error("❌ Error deleting notes from Firebase: %s", e)
         # Fallback to test storage
-        if notes_id in test_storage.get('notes', {}):
-            del test_storage['notes'][notes_id]
-            print(f"📝 Deleted study notes {notes_id} from test storage (fallback)")
+        if _test_remove('notes', notes_id):
+            logger.warning("📝 Deleted study notes %s from test storage (fallback)", notes_id)
         raise e
 
+async def backfill_notes_timestamps() -> int:
+    """Rewrite study-note dates stored as ISO strings to Firestore timestamps
+
+    One-off migration (see migrate_notes_timestamps.py): until it has run, string-typed
+    dates sort ahead of every timestamp under order_by('created_at', DESCENDING).
+    Returns the number of notes updated.
+    """
+    updates = []
+    async for doc in _collection(NOTES).select(list(_DT_FIELDS)).stream():
+        data = doc.to_dict() or {}
+        fields = {field: _parse_legacy_dt(value) for field in _DT_FIELDS
+                  if isinstance(value := data.get(field), str)}
+        if fields:
+            updates.append((doc.reference, fields))
+    
+    commits = []
+    for start in range(0, len(updates), FIRESTORE_BATCH_LIMIT):
+        batch = get_db().batch()
+        for ref, fields in updates[start:start + FIRESTORE_BATCH_LIMIT]:
+            batch.update(ref, fields)
+        commits.append(batch.commit())
+    await asyncio.gather(*commits)
+    logger.info("✅ Backfilled timestamps on %s study notes", len(updates))
+    return len(updates)
+
 async def get_notes_analytics(user_id: str) -> Dict[str, Any]:
     """Get analytics data for user's study notes from Firebase"""
     try:
-        def _get_analytics():
-            docs = (db.collection('study_notes')
-                    .where('user_id', '==', user_id)
-                    .stream())
-            
-            total_notes = 0
-            total_score = 0
-            topics_frequency = {}
-            study_priorities = {"low": 0, "medium": 0, "high": 0, "urgent": 0}
+        # Only the fields aggregated below are transferred, not the notes text
+        docs = (_collection(NOTES)
+                .where('user_id', '==', user_id)
+                .select(['performance_summary.score', 'topics_covered', 'study_priority'])
+                .stream())
+        
+        total_notes = 0
+        total_score = 0
+        topics_frequency = {}
+        study_priorities = {"low": 0, "medium": 0, "high": 0, "urgent": 0}
+        
+        async for doc in docs:
+            notes_data = doc.to_dict()
+            total_notes += 1
             
-            for doc in docs:
-                notes_data = doc.to_dict()
-                total_notes += 1
-                
-                # Aggregate performance data
-                performance = notes_data.get('performance_summary', {})
-                score = performance.get('score', 0)
-                total_score += score
-                
-                # Count topic frequency
-                topics = notes_data.get('topics_covered', [])
-                for topic in topics:
-                    topics_frequency[topic] = topics_frequency.get(topic, 0) + 1
-                
-                # Count study priorities
-                priority = notes_data.get('study_priority', 'medium')
-                if priority in study_priorities:
-                    study_priorities[priority] += 1
+            # Aggregate performance data
+            performance = notes_data.get('performance_summary', {})
+            score = performance.get('score', 0)
+            total_score += score
             
-            # Calculate averages and insights
-            avg_score = total_score / total_notes if total_notes > 0 else 0
-            most_common_topics = sorted(topics_frequency.items(), key=lambda x: x[1], reverse=True)[:5]
+            # Count topic frequency
+            topics = notes_data.get('topics_covered', [])
+            for topic in topics:
+                topics_frequency[topic] = topics_frequency.get(topic, 0) + 1
             
-            return {
-                "total_notes": total_notes,
-                "average_score": round(avg_score, 1),
-                "most_common_weak_topics": [{"topic": topic, "frequency": freq} for topic, freq in most_common_topics],
-                "study_priority_distribution": study_priorities,
-                "total_topics_covered": len(topics_frequency)
-            }
+            # Count study priorities
+            priority = notes_data.get('study_priority', 'medium')
+            if priority in study_priorities:
+                study_priorities[priority] += 1
+        
+        # Calculate averages and insights
+        avg_score = total_score / total_notes if total_notes > 0 else 0
+        most_common_topics = sorted(topics_frequency.items(), key=lambda x: x[1], reverse=True)[:5]
+        
+        result = {
+            "total_notes": total_notes,
+            "average_score": round(avg_score, 1),
+            "most_common_weak_topics": [{"topic": topic, "frequency": freq} for topic, freq in most_common_topics],
+            "study_priority_distribution": study_priorities,
+            "total_topics_covered": len(topics_frequency)
+        }
         
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(executor, _get_analytics)
-        print(f"✅ Retrieved analytics for user {user_id} from Firebase")
+        logger.debug("✅ Retrieved analytics for user %s from Firebase", user_id)
         return result
         
     except Exception as e:
-        print(f"❌ Error getting analytics from Firebase: {e}")
+        logger.error("❌ Error getting analytics from Firebase: %s", e)
         return {
             "total_notes": 0,
             "average_score": 0,
@@ -1,27 +1,49 @@
 import hashlib
-import uuid
-from typing import List, Dict, Any
+import secrets
+from typing import List, Dict, Any, Tuple, Union, BinaryIO
+from collections import Counter
+import numpy as np
 from datetime import datetime
 import re
 
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_UNSAFE_RE = re.compile(r'[^\w\s.-]')
+_WS_RE = re.compile(r'\s+')
+_WORD_RE = re.compile(r'\b[a-zA-Z]{3,}\b')
+# Maps the common non-word characters (through General Punctuation) to spaces so
+# str.split() yields the word runs \b...\b would delimit; tokens that still hold
+# non-ASCII characters (CJK punctuation, symbols, emoji...) go through _WORD_RE
+_NON_WORD = str.maketrans({c: ' ' for c in map(chr, range(0x2070)) if not (c.isalnum() or c == '_')})
+
 def generate_unique_id(prefix: str = "") -> str:
     """Generate a unique ID with optional prefix"""
-    return f"{prefix}_{uuid.uuid4().hex}" if prefix else uuid.uuid4().hex
+    token = secrets.token_hex(16)
+    return f"{prefix}_{token}" if prefix else token
+
+HASH_CHUNK_SIZE = 1 << 20  # 1 MiB reads when hashing streams
+
+def hash_content(content: Union[str, bytes, memoryview]) -> str:
+    """Generate MD5 hash of content (str is hashed as UTF-8; bytes are hashed as-is)"""
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    return hashlib.md5(data).hexdigest()
 
-def hash_content(content: str) -> str:
-    """Generate MD5 hash of content"""
-    return hashlib.md5(content.encode('utf-8')).hexdigest()
+def hash_file(fp: BinaryIO) -> str:
+    """Generate MD5 hash of a binary stream, reading it in fixed-size chunks"""
+    md5 = hashlib.md5()
+    buf = memoryview(bytearray(HASH_CHUNK_SIZE))
+    while n := fp.readinto(buf):
+        md5.update(buf[:n])
+    return md5.hexdigest()
 
 def validate_email(email: str) -> bool:
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return _EMAIL_RE.match(email) is not None
 
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename for storage"""
     # Remove or replace unsafe characters
-    filename = re.sub(r'[^\w\s.-]', '', filename)
-    filename = re.sub(r'\s+', '_', filename)
+    filename = _UNSAFE_RE.sub('', filename)
+    filename = _WS_RE.sub('_', filename)
     return filename[:255]  # Limit length
 
 def calculate_reading_time(text: str, words_per_minute: int = 200) -> int:
@@ -29,52 +51,54 @@ def calculate_reading_time(text: str, words_per_minute: int = 200) -> int:
     word_count = len(text.split())
     return max(1, word_count // words_per_minute)
 
-def chunk_list(lst: List[Any], chunk_size: int) -> List[List[Any]]:
-    """Split a list into chunks of specified size"""
-    return [lst[i:i + chunk_size] for i in range(0, len(lst), chunk_size)]
+try:
+    from itertools import batched  # Python 3.12+
+
+    def chunk_list(lst: List[Any], chunk_size: int) -> List[List[Any]]:
+        """Split a list into chunks of specified size"""
+        return list(map(list, batched(lst, chunk_size)))
+except ImportError:
+    def chunk_list(lst: List[Any], chunk_size: int) -> List[List[Any]]:
+        """Split a list into chunks of specified size"""
+        return [lst[i:i + chunk_size] for i in range(0, len(lst), chunk_size)]
 
 def format_score(score: float) -> str:
     """Format score as percentage string"""
     return f"{score * 100:.1f}%"
 
+# (seconds per unit, unit name), largest first
+_TIME_UNITS = ((86400, 'day'), (3600, 'hour'), (60, 'minute'))
+
 def time_ago(dt: datetime) -> str:
     """Get human-readable time difference"""
-    now = datetime.now()
-    diff = now - dt
-    
-    if diff.days > 0:
-        return f"{diff.days} day{'s' if diff.days != 1 else ''} ago"
-    elif diff.seconds > 3600:
-        hours = diff.seconds // 3600
-        return f"{hours} hour{'s' if hours != 1 else ''} ago"
-    elif diff.seconds > 60:
-        minutes = diff.seconds // 60
-        return f"{minutes} minute{'s' if minutes != 1 else ''} ago"
-    else:
-        return "Just now"
+    total = (datetime.now() - dt).total_seconds()
+    for seconds, unit in _TIME_UNITS:
+        if total >= seconds:
+            n = int(total // seconds)
+            return f"{n} {unit}{'s' if n != 1 else ''} ago"
+    return "Just now"
+
+# Common stop words left out of keywords
+_STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
+    'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+    'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those'
+})
 
 def extract_keywords(text: str, max_keywords: int = 10) -> List[str]:
     """Extract keywords from text (simple implementation)"""
-    # Remove common stop words
-    stop_words = {
-        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 
-        'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
-        'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
-        'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those'
-    }
-    
     # Extract words and filter
-    words = re.findall(r'\b[a-zA-Z]{3,}\b', text.lower())
-    keywords = [word for word in words if word not in stop_words]
-    
-    # Count frequencies
-    word_freq = {}
-    for word in keywords:
-        word_freq[word] = word_freq.get(word, 0) + 1
+    keywords = []
+    for word in text.lower().translate(_NON_WORD).split():
+        if word.isascii():
+            if len(word) >= 3 and word.isalpha() and word not in _STOP_WORDS:
+                keywords.append(word)
+        else:
+            keywords.extend(w for w in _WORD_RE.findall(word) if w not in _STOP_WORDS)
     
-    # Return top keywords
-    sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-    return [word for word, _ in sorted_words[:max_keywords]]
+    # Return the most frequent keywords (ties keep first-seen order)
+    return [word for word, _ in Counter(keywords).most_common(max_keywords)]
 
 class ContentAnalyzer:
     """Utility class for content analysis"""
@@ -83,11 +107,11 @@ class ContentAnalyzer:
     def get_difficulty_level(text: str) -> int:
         """Estimate content difficulty level (1-5)"""
         # Simple heuristic based on sentence length and word complexity
-        sentences = text.split('.')
-        avg_sentence_length = sum(len(s.split()) for s in sentences) / len(sentences) if sentences else 0
+        # split('.') always yielded count('.') + 1 sentences, so count instead of splitting
+        words = text.split()
+        avg_sentence_length = len(words) / (text.count('.') + 1)
         
         # Count complex words (>6 characters)
-        words = text.split()
         complex_words = sum(1 for word in words if len(word) > 6)
         complexity_ratio = complex_words / len(words) if words else 0
         
@@ -110,25 +134,28 @@ class ContentAnalyzer:
         # In production, you might use NLP libraries like spaCy or NLTK
         keywords = extract_keywords(text, max_keywords=15)
         
-        # Group related keywords (very basic clustering)
+        # Group related keywords (very basic clustering): the most frequent
+        # ungrouped keyword seeds a topic and absorbs the remaining keywords
+        # related to it, so each pass only scans what's left ungrouped
         topics = []
-        used_words = set()
+        remaining = keywords
         
-        for keyword in keywords:
-            if keyword not in used_words:
-                topic = [keyword]
-                used_words.add(keyword)
-                
-                # Look for related words (simple substring matching)
-                for other_keyword in keywords:
-                    if (other_keyword not in used_words and 
-                        (keyword in other_keyword or other_keyword in keyword)):
-                        topic.append(other_keyword)
-                        used_words.add(other_keyword)
-                
-                topics.append(' '.join(topic))
+        while remaining and len(topics) < 5:  # Only the top 5 topics are returned
+            keyword = remaining[0]
+            topic = [keyword]
+            ungrouped = []
+            
+            # Look for related words (simple substring matching)
+            for other_keyword in remaining[1:]:
+                if keyword in other_keyword or other_keyword in keyword:
+                    topic.append(other_keyword)
+                else:
+                    ungrouped.append(other_keyword)
+            
+            topics.append(' '.join(topic))
+            remaining = ungrouped
         
-        return topics[:5]  # Return top 5 topics
+        return topics
 
 # Performance monitoring utilities
 class PerformanceTracker:
@@ -140,40 +167,32 @@ class PerformanceTracker:
         if len(attempts) < 2:
             return 0.0
         
-        scores = [attempt.get('score', 0) for attempt in attempts]
-        
-        # Simple linear trend calculation
-        n = len(scores)
-        sum_x = sum(range(n))
-        sum_y = sum(scores)
-        sum_xy = sum(i * score for i, score in enumerate(scores))
-        sum_x2 = sum(i * i for i in range(n))
-        
-        if n * sum_x2 - sum_x * sum_x == 0:
-            return 0.0
+        scores = np.fromiter((attempt.get('score', 0) for attempt in attempts),
+                             dtype=np.float64, count=len(attempts))
         
-        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x * sum_x)
-        return slope
+        # Least-squares slope of score over attempt index: cov(x, y) / var(x)
+        x = np.arange(scores.size, dtype=np.float64)
+        x -= x.mean()
+        return float(x @ (scores - scores.mean()) / (x @ x))
     
     @staticmethod
     def identify_knowledge_gaps(quiz_results: List[Dict[str, Any]]) -> List[str]:
         """Identify areas where user consistently performs poorly"""
-        topic_scores = {}
+        # Running (score total, count) per topic
+        topic_stats: Dict[str, Tuple[float, int]] = {}
         
         for result in quiz_results:
             topics = result.get('topics', [])
             score = result.get('score', 0)
             
             for topic in topics:
-                if topic not in topic_scores:
-                    topic_scores[topic] = []
-                topic_scores[topic].append(score)
+                total, count = topic_stats.get(topic, (0.0, 0))
+                topic_stats[topic] = (total + score, count + 1)
         
         # Find topics with consistently low scores
         gaps = []
-        for topic, scores in topic_scores.items():
-            avg_score = sum(scores) / len(scores)
-            if avg_score < 0.6 and len(scores) >= 2:  # Consistent poor performance
+        for topic, (total, count) in topic_stats.items():
+            if count >= 2 and total / count < 0.6:  # Consistent poor performance
                 gaps.append(topic)
         
         return gaps
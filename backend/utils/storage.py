@@ -1,40 +1,44 @@
 from firebase_admin import storage
-from typing import Optional
+from typing import Optional, List, Tuple
+import asyncio
 import uuid
 from datetime import datetime, timedelta
+import functools
+import time
 
-bucket = storage.bucket()
+@functools.lru_cache(maxsize=1)
+def _bucket():
+    """Get the default Storage bucket, created on first use rather than at import"""
+    return storage.bucket()
 
 async def upload_to_firebase_storage(file_bytes: bytes, filename: str) -> str:
     """Upload file to Firebase Storage and return download URL"""
     try:
         # Generate unique path
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
         unique_filename = f"pdfs/{timestamp}_{filename}"
         
-        # Upload file
-        blob = bucket.blob(unique_filename)
-        blob.upload_from_string(file_bytes, content_type='application/pdf')
+        # Upload file without blocking the event loop
+        blob = _bucket().blob(unique_filename)
+        await asyncio.to_thread(blob.upload_from_string, file_bytes, content_type='application/pdf')
         
         # Make blob publicly accessible (optional, depending on your security needs)
         # blob.make_public()
         
-        # Generate signed URL (valid for 1 hour)
-        url = blob.generate_signed_url(
-            version="v4",
-            expiration=datetime.utcnow() + timedelta(hours=1),
-            method="GET"
-        )
-        
-        return unique_filename  # Return path, not URL for security
+        # Return path, not URL for security; use get_file_download_url for a signed URL
+        return unique_filename
         
     except Exception as e:
         raise Exception(f"Failed to upload file to storage: {str(e)}")
 
+async def upload_many(files: List[Tuple[bytes, str]]) -> List[str]:
+    """Upload several (file_bytes, filename) pairs concurrently and return their storage paths"""
+    return await asyncio.gather(*[upload_to_firebase_storage(file_bytes, filename) for file_bytes, filename in files])
+
 async def get_file_download_url(file_path: str, expiration_hours: int = 1) -> str:
     """Generate a signed URL for file download"""
     try:
-        blob = bucket.blob(file_path)
+        blob = _bucket().blob(file_path)
         
         url = blob.generate_signed_url(
             version="v4",
@@ -50,8 +54,8 @@ async def get_file_download_url(file_path: str, expiration_hours: int = 1) -> st
 async def delete_file_from_storage(file_path: str) -> None:
     """Delete file from Firebase Storage"""
     try:
-        blob = bucket.blob(file_path)
-        blob.delete()
+        blob = _bucket().blob(file_path)
+        await asyncio.to_thread(blob.delete)
     except Exception as e:
         raise Exception(f"Failed to delete file from storage: {str(e)}")
 
@@ -59,24 +63,20 @@ async def upload_user_file(file_bytes: bytes, user_id: str, original_filename: s
     """Upload user file with organized folder structure"""
     try:
         # Create organized path
-        file_extension = original_filename.split('.')[-1] if '.' in original_filename else 'pdf'
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_extension = original_filename.rpartition('.')[2] if '.' in original_filename else 'pdf'
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
         unique_id = uuid.uuid4().hex[:8]
         
         file_path = f"users/{user_id}/pdfs/{timestamp}_{unique_id}.{file_extension}"
         
-        # Upload file
-        blob = bucket.blob(file_path)
-        blob.upload_from_string(file_bytes, content_type='application/pdf')
-        
-        # Set metadata
-        metadata = {
+        # Upload file with its metadata in the same request, off the event loop
+        blob = _bucket().blob(file_path)
+        blob.metadata = {
             'original_filename': original_filename,
             'upload_date': datetime.now().isoformat(),
             'user_id': user_id
         }
-        blob.metadata = metadata
-        blob.patch()
+        await asyncio.to_thread(blob.upload_from_string, file_bytes, content_type='application/pdf')
         
         return file_path
         